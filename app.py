@@ -7,6 +7,7 @@ from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from scheduler.scheduler import init_scheduler
+from modules.jobs import job_manager
 import uvicorn
 from asgiref.wsgi import WsgiToAsgi
 from flask_restx import Api, fields
@@ -23,6 +24,13 @@ routes(app, api)
 logger(app)
 CORS(app)
 
+job_manager.configure(
+    max_workers=app.config['JOB_MAX_WORKERS'],
+    max_pending=app.config['JOB_MAX_PENDING'],
+    result_ttl=app.config['JOB_RESULT_TTL'],
+    result_dir=app.config['JOB_RESULT_DIR'] or None,
+)
+
 app.logger.info("應用程式啟動中...")
 
 init_scheduler(app)
@@ -25,6 +25,70 @@ class Config:
     FESTO_HOST = os.getenv('FESTO_HOST', '192.168.1.100')
     FESTO_PORT = int(os.getenv('FESTO_PORT', 502))
     FESTO_DEVIATION = int(os.getenv('FESTO_DEVIATION', 3))
+    FESTO_TIMEOUT = float(os.getenv('FESTO_TIMEOUT', 5))
+    FESTO_RETRIES = int(os.getenv('FESTO_RETRIES', 3))
+    # 閒置超過此秒數才在請求前做存活探測 (0 代表停用)
+    FESTO_KEEPALIVE_INTERVAL = float(os.getenv('FESTO_KEEPALIVE_INTERVAL', 0))
+    # 重新連線 (與 slave 讀寫) 失敗時的指數退避 (秒)
+    FESTO_BACKOFF_BASE = float(os.getenv('FESTO_BACKOFF_BASE', 0.5))
+    FESTO_BACKOFF_MAX = float(os.getenv('FESTO_BACKOFF_MAX', 30))
+    # 輪詢模式: async (同時輪詢所有 slave) 或 sync (逐一輪詢)
+    FESTO_POLL_MODE = os.getenv('FESTO_POLL_MODE', 'async')
+    FESTO_PIPELINE_DEPTH = int(os.getenv('FESTO_PIPELINE_DEPTH', 1))
+    FESTO_DEVICE_DEADLINE = float(os.getenv('FESTO_DEVICE_DEADLINE', 2))
+    # 輪詢過的 slave 的等待秒數 (FESTO_DEVICE_DEADLINE 只用於第一次輪詢)，
+    # 應大於最慢的正常設備回應時間，離線的設備每次只佔用這麼久
+    FESTO_HEALTHY_DEADLINE = float(os.getenv('FESTO_HEALTHY_DEADLINE', 0.3))
+    # 一次整批讀寫的最長秒數，應小於排程間隔；離線的 slave 依 FESTO_BACKOFF_* 暫停輪詢
+    FESTO_BATCH_DEADLINE = float(os.getenv('FESTO_BATCH_DEADLINE', 2.5))
+    # 同時平行輪詢的閘道數上限 (FestoMain 未指定閘道時使用 FESTO_HOST/FESTO_PORT)
+    FESTO_MAX_GATEWAYS = int(os.getenv('FESTO_MAX_GATEWAYS', 16))
+
+    # 歷史資料批次寫入: 累積筆數或秒數任一達到就寫入，緩衝區上限避免資料庫異常時耗盡記憶體
+    HISTORY_FLUSH_SIZE = int(os.getenv('HISTORY_FLUSH_SIZE', 200))
+    HISTORY_FLUSH_INTERVAL = float(os.getenv('HISTORY_FLUSH_INTERVAL', 30))
+    HISTORY_BUFFER_MAX = int(os.getenv('HISTORY_BUFFER_MAX', 50000))
+    # 歷史資料保留天數，過期資料每批刪除筆數與批次間暫停秒數
+    HISTORY_RETENTION_DAYS = int(os.getenv('HISTORY_RETENTION_DAYS', 30))
+    HISTORY_DELETE_CHUNK_SIZE = int(os.getenv('HISTORY_DELETE_CHUNK_SIZE', 5000))
+    HISTORY_DELETE_CHUNK_SLEEP = float(os.getenv('HISTORY_DELETE_CHUNK_SLEEP', 0.1))
+    # 分區模式 (僅 MySQL，需執行 migration): day 或 month，空白代表不分區；預先建立的未來分區數
+    HISTORY_PARTITION_MODE = os.getenv('HISTORY_PARTITION_MODE', '')
+    HISTORY_PARTITION_AHEAD = int(os.getenv('HISTORY_PARTITION_AHEAD', 7))
+    # 寫入歷史資料時一併更新分鐘/小時彙總表，歷史圖表優先查詢彙總表；彙總表保留天數
+    HISTORY_ROLLUP_ENABLED = os.getenv('HISTORY_ROLLUP_ENABLED', 'True').lower() in ('true', '1', 't')
+    HISTORY_ROLLUP_RETENTION_DAYS = int(os.getenv('HISTORY_ROLLUP_RETENTION_DAYS', 365))
+    # /history/batch 批次清單的快取秒數 (0 代表不快取)
+    HISTORY_BATCH_CACHE_TTL = float(os.getenv('HISTORY_BATCH_CACHE_TTL', 30))
+    # 過期歷史資料刪除前封存成 Parquet 檔的目錄 (空白代表不封存直接刪除) 與每批筆數
+    HISTORY_ARCHIVE_DIR = os.getenv('HISTORY_ARCHIVE_DIR', '')
+    HISTORY_ARCHIVE_CHUNK_SIZE = int(os.getenv('HISTORY_ARCHIVE_CHUNK_SIZE', 100000))
+
+    # 背景工作 (/history/jobs): 同時執行數、未完成工作上限、結果保留秒數與結果檔案目錄
+    JOB_MAX_WORKERS = int(os.getenv('JOB_MAX_WORKERS', 2))
+    JOB_MAX_PENDING = int(os.getenv('JOB_MAX_PENDING', 100))
+    JOB_RESULT_TTL = float(os.getenv('JOB_RESULT_TTL', 3600))
+    JOB_RESULT_DIR = os.getenv('JOB_RESULT_DIR', '')
+
+    # /festo/stream 即時推送: 同時連線數上限與保持連線的間隔秒數
+    # 每個連線佔用一個 WEB_THREADS 執行緒，gunicorn 啟動時檢查不超過 WEB_THREADS 的一半
+    STREAM_MAX_CLIENTS = int(os.getenv('STREAM_MAX_CLIENTS', 8))
+    STREAM_KEEPALIVE = float(os.getenv('STREAM_KEEPALIVE', 15))
+
+    # 排程控制迴圈: tick 間隔秒數與過載時只輪詢執行中設備的降級模式
+    CONTROL_LOOP_INTERVAL = float(os.getenv('CONTROL_LOOP_INTERVAL', 5))
+    CONTROL_LOOP_DEGRADE = os.getenv('CONTROL_LOOP_DEGRADE', 'True').lower() in ('true', '1', 't')
+    # tick 耗時連續 DEGRADE_AFTER 次超過間隔的 DEGRADE_THRESHOLD 比例時降級，連續 RECOVER_AFTER 次正常後恢復
+    CONTROL_LOOP_DEGRADE_THRESHOLD = float(os.getenv('CONTROL_LOOP_DEGRADE_THRESHOLD', 0.8))
+    CONTROL_LOOP_DEGRADE_AFTER = int(os.getenv('CONTROL_LOOP_DEGRADE_AFTER', 2))
+    CONTROL_LOOP_RECOVER_AFTER = int(os.getenv('CONTROL_LOOP_RECOVER_AFTER', 12))
+
+    # /festo/executing 快照: 排程每個 tick 發佈，超過秒數未更新時改為即時計算
+    EXECUTING_SNAPSHOT_MAX_AGE = float(os.getenv('EXECUTING_SNAPSHOT_MAX_AGE', 15))
+    # 設定時快照同時寫入 Redis 供外部系統讀取 (例如 redis://localhost:6379/0)，API 只讀取行程內快照
+    REDIS_URL = os.getenv('REDIS_URL', '')
+    # /festo 設備清單的快取秒數，設備、配方或排程被修改時立即失效 (0 代表不快取)
+    FESTO_LIST_CACHE_TTL = float(os.getenv('FESTO_LIST_CACHE_TTL', 60))
     
     # 对密码进行百分号编码
     encoded_password = quote_plus(DB_PASSWORD)
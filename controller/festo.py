@@ -1,4 +1,4 @@
-from flask import jsonify, make_response, current_app
+from flask import Response, jsonify, make_response, current_app, request
 from models.festo import FestoMain
 from models.formula import FormulaMain
 from models.schedule import Schedule
@@ -6,6 +6,14 @@ from controller.schedule import update_schedules
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime, timedelta
 from models.shared import db
+from modules.schedule_cache import schedule_cache, load_tick_festos
+from modules.broadcaster import festo_broadcaster
+from modules.executing_snapshot import executing_snapshot, build_executing_info, make_snapshot
+from modules.ttl_cache import TTLCache
+
+# Serialized festo listing keyed by the schedule cache version, which every
+# festo/formula/schedule change bumps
+festo_list_cache = TTLCache(max_entries=4)
 
 
 def create(data):
@@ -15,11 +23,15 @@ def create(data):
         slave_id = data.get("slaveId")
         batch_number = data.get("batchNumber")
         warning_time = data.get("warningTime")
+        gateway_host = data.get("gatewayHost")
+        gateway_port = data.get("gatewayPort")
 
         # Create a new FestoMain object and set parameters
         new_festo = FestoMain(
             name=name,
             slave_id=slave_id,
+            gateway_host=gateway_host,
+            gateway_port=gateway_port,
             batch_number=batch_number,
             warning_time=warning_time,
             create_time=datetime.now(),
@@ -39,6 +51,7 @@ def create(data):
         # Add the new FestoMain object to the database session
         db.session.add(new_schedule)
         db.session.commit()
+        schedule_cache.invalidate()
 
         # Build the result to return
         result = {"code": 201, "msg": "Festo created", "id": new_festo.id}
@@ -90,6 +103,8 @@ def read(festo_id):
                 "formulaName": formula_name,
                 "formulaId": formula_id,
                 "slaveId": festo.slave_id,
+                "gatewayHost": festo.gateway_host,
+                "gatewayPort": festo.gateway_port,
                 "batchNumber": festo.batch_number,
                 "warningTime": festo.warning_time,
                 "createTime": festo.create_time.isoformat() if festo.create_time else None,
@@ -107,38 +122,70 @@ def read(festo_id):
 
 def read_multi():
     try:
-        festos = FestoMain.query.all()
-
-        festo_list = []
-        for festo in festos:
-            formula_name = festo.formula.name if festo.formula else None
-            formula_id = festo.formula.id if festo.formula else None
-            schedule_id = festo.schedule.id if festo.schedule else None
-
-            festo_list.append({
-                "id": festo.id,
-                "name": festo.name,
-                "formulaName": formula_name,
-                "formulaId": formula_id,
-                "slaveId": festo.slave_id,
-                "batchNumber": festo.batch_number,
-                "warningTime": festo.warning_time*5/60,
-                "scheduleId": schedule_id,
-                "createTime": festo.create_time.isoformat() if festo.create_time else None,
-                "updateTime": festo.update_time.isoformat() if festo.update_time else None
-            })
+        # Read the version first so a change during the load is never cached as current
+        version = schedule_cache.version
+        snapshot = festo_list_cache.get(
+            version,
+            lambda: make_snapshot(__load_festo_list(), version),
+            ttl=current_app.config.get('FESTO_LIST_CACHE_TTL', 60))
 
-        result = {"code": 200, "msg": "Success",
-                  "data": festo_list}
-        return result, 200
+        return __snapshot_response(snapshot)
 
     except SQLAlchemyError as e:
         current_app.logger.error(e)
-        return {"code": 500, "msg": "Database error."}, 500
+        return make_response(jsonify({"code": 500, "msg": "Database error."}), 500)
 
     except Exception as e:
         current_app.logger.error(e)
-        return {"code": 500, "msg": "An error occurred."}, 500
+        return make_response(jsonify({"code": 500, "msg": "An error occurred."}), 500)
+
+    finally:
+        db.session.close()
+
+
+def __load_festo_list():
+    # One joined query selecting only the listed columns
+    rows = db.session.query(
+        FestoMain.id,
+        FestoMain.name,
+        FestoMain.slave_id,
+        FestoMain.gateway_host,
+        FestoMain.gateway_port,
+        FestoMain.batch_number,
+        FestoMain.warning_time,
+        FestoMain.create_time,
+        FestoMain.update_time,
+        FormulaMain.id.label("formula_id"),
+        FormulaMain.name.label("formula_name"),
+        Schedule.id.label("schedule_id"),
+    ).outerjoin(
+        FormulaMain, FestoMain.formula_main_id == FormulaMain.id
+    ).outerjoin(
+        Schedule, Schedule.festo_main_id == FestoMain.id
+    ).order_by(FestoMain.id).all()
+
+    return [{
+        "id": row.id,
+        "name": row.name,
+        "formulaName": row.formula_name,
+        "formulaId": row.formula_id,
+        "slaveId": row.slave_id,
+        "gatewayHost": row.gateway_host,
+        "gatewayPort": row.gateway_port,
+        "batchNumber": row.batch_number,
+        "warningTime": row.warning_time*5/60,
+        "scheduleId": row.schedule_id,
+        "createTime": row.create_time.isoformat() if row.create_time else None,
+        "updateTime": row.update_time.isoformat() if row.update_time else None
+    } for row in rows]
+
+
+def __snapshot_response(snapshot):
+    # Serialized once per snapshot; unchanged polls get 304 without a body
+    response = Response(snapshot.body, mimetype='application/json')
+    response.set_etag(snapshot.etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
 
 
 def update(festo_id, data):
@@ -152,6 +199,8 @@ def update(festo_id, data):
         formula_id = data.get("formulaId")
         batch_number = data.get("batchNumber")
         warning_time = data.get("warningTime")
+        gateway_host = data.get("gatewayHost")
+        gateway_port = data.get("gatewayPort")
         option = data.get("option")
 
         if option:
@@ -214,8 +263,15 @@ def update(festo_id, data):
         if warning_time is not None:
             festo.warning_time = warning_time
 
+        if gateway_host is not None:
+            festo.gateway_host = gateway_host or None
+
+        if gateway_port is not None:
+            festo.gateway_port = gateway_port or None
+
         # Commit the changes to the database
         db.session.commit()
+        schedule_cache.invalidate()
 
         # Build the response
         result = {"code": 200, "msg": "Success", "id": festo.id}
@@ -250,6 +306,7 @@ def delete(festo_id):
         # Delete the festo from the database
         db.session.delete(festo)
         db.session.commit()
+        schedule_cache.invalidate()
 
         # Build the response
         result = {"code": 200, "msg": "Success", "id": festo.id}
@@ -270,70 +327,38 @@ def delete(festo_id):
 
 def get_currently_executing_info():
     try:
-        # 获取当前时间
-        current_time = datetime.now()
-
-        # 查询所有 FestoMain
-        festos = FestoMain.query.all()
-
-        executing_info = []
-
-        for festo in festos:
-            # 跳過沒有 schedule 的 festo
-            if not festo.schedule or not festo.schedule.schedule_details:
-                continue
-            
-            # 查询与当前时间最接近的 Schedule
-            nearest_schedule = None
-            min_time_diff = None
-
-            for schedule in festo.schedule.schedule_details:
-                time_start = schedule.time_start
-                time_end = schedule.time_end
-
-                # 跳過沒有時間資料的 schedule
-                if not time_start or not time_end:
-                    continue
-
-                # 检查当前时间是否在时间范围内
-                if time_start <= current_time <= time_end:
-                    nearest_schedule = schedule
-                    break
-
-                # 计算当前时间距离该 Schedule 最近的时间差
-                time_diff = min(abs((current_time - time_start).total_seconds()),
-                                abs((current_time - time_end).total_seconds()))
-
-                if min_time_diff is None or time_diff < min_time_diff:
-                    min_time_diff = time_diff
-                    nearest_schedule = schedule
-
-            if nearest_schedule and festo.formula:
-                formula = festo.formula
-
-                executing_info.append({
-                    "id": festo.id,
-                    "festoName": festo.name,
-                    "warningTime": festo.warning_time*5/60,
-                    "formulaName": formula.name,
-                    "schedulePressure": nearest_schedule.pressure,
-                    "scheduleSequence": nearest_schedule.sequence,
-                    "scheduleStatus": nearest_schedule.status,
-                    "checkPressure": nearest_schedule.check_pressure
-                })
-
-        # 将查询结果包装成响应格式
-        result = {"code": 200, "msg": "Success", "data": executing_info}
-        return result, 200
+        # The scheduler publishes a serialized snapshot after every tick
+        snapshot = executing_snapshot.get(schedule_cache.version)
+
+        if snapshot is None:
+            # No fresh snapshot (scheduler stopped or schedules just changed), build one now
+            current_time = datetime.now()
+            festos, timeline, version = schedule_cache.get(load_tick_festos)
+            snapshot = make_snapshot(
+                build_executing_info(festos, timeline, current_time), version)
+
+        return __snapshot_response(snapshot)
 
     except SQLAlchemyError as e:
         db.session.rollback()
         current_app.logger.error(e)
-        return {"code": 500, "msg": "Database error."}, 500
+        return make_response(jsonify({"code": 500, "msg": "Database error."}), 500)
 
     except Exception as e:
         current_app.logger.error(e)
-        return {"code": 500, "msg": "An error occurred."}, 500
+        return make_response(jsonify({"code": 500, "msg": "An error occurred."}), 500)
 
     finally:
         db.session.close()
+
+
+def stream_executing():
+    # Every client gets the payload the scheduler publishes once per tick
+    client = festo_broadcaster.subscribe()
+    if client is None:
+        return make_response(jsonify({"code": 503, "msg": "Too many stream clients."}), 503)
+
+    response = Response(festo_broadcaster.stream(client), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
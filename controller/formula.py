@@ -4,6 +4,7 @@ from models.shared import db
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime
 import pytz
+from modules.schedule_cache import schedule_cache
 
 
 def create(data):
@@ -158,6 +159,7 @@ def update(formula_id, data):
             db.session.add(new_detail)
 
         db.session.commit()
+        schedule_cache.invalidate()
 
         # Build the result to return
         result = {"code": 200, "msg": "Success"}
@@ -189,6 +191,7 @@ def delete(formula_id):
         # Delete the formula itself
         db.session.delete(formula)
         db.session.commit()
+        schedule_cache.invalidate()
 
         # Build the result to return
         result = {"code": 200, "msg": "Success"}
@@ -1,12 +1,23 @@
-from flask import current_app, jsonify, make_response, request, send_file
+from flask import Response, current_app, jsonify, make_response, request, send_file, stream_with_context
 from models.model import FestoHistory
 from models.shared import db
+from modules.history_rollup import ROLLUPS, rollup_covers
+from modules.downsample import METHODS, downsample_indices
+from modules.batch_catalog import batch_numbers_between
+from modules.ttl_cache import TTLCache
+from modules.history_arrow import FORMATS, batch_rows, iter_record_batches
+from modules.jobs import SUCCEEDED, JobCancelled, job_manager
+from modules.history_archive import aggregate_archived, archived_time_range, iter_archived_batches, read_archived
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import func
+from sqlalchemy import func, literal_column, select
 from datetime import datetime, timedelta
+import numpy as np
 import pytz
 import csv
 import io
+import itertools
+
+batch_numbers_cache = TTLCache()
 
 
 def get_unique_batch_numbers():
@@ -14,22 +25,15 @@ def get_unique_batch_numbers():
         start_date_str = request.args.get('startTime')
         end_date_str = request.args.get('endTime')
 
-        # Convert date strings to datetime objects
-        taipei_tz = pytz.timezone('Asia/Taipei')
-        start_date = datetime.strptime(
-            start_date_str, '%Y-%m-%d %H:%M:%S').replace(tzinfo=taipei_tz)
-        end_date = datetime.strptime(
-            end_date_str, '%Y-%m-%d %H:%M:%S').replace(tzinfo=taipei_tz)
-
-        # Query the database
-        unique_batch_numbers = db.session.query(FestoHistory.batch_number).filter(
-            FestoHistory.create_time >= start_date,
-            FestoHistory.create_time <= end_date
-        ).distinct().all()
+        start_date = datetime.strptime(start_date_str, '%Y-%m-%d %H:%M:%S')
+        end_date = datetime.strptime(end_date_str, '%Y-%m-%d %H:%M:%S')
 
-        # Convert result to a list of batch numbers
-        unique_batch_numbers_list = [
-            item.batch_number for item in unique_batch_numbers]
+        # Read the small batch catalog instead of scanning festo_history,
+        # the dropdown asks for the same range repeatedly so keep it briefly
+        unique_batch_numbers_list = batch_numbers_cache.get(
+            (start_date, end_date),
+            lambda: batch_numbers_between(db.session, start_date, end_date),
+            ttl=current_app.config.get('HISTORY_BATCH_CACHE_TTL', 30))
 
         result = {
             "code": 200,
@@ -48,52 +52,98 @@ def get_unique_batch_numbers():
         return {"code": 500, "msg": "An error occurred."}, 500
 
 
-def get_batch_records_csv(data):
-    try:
-        start_date_str = data.get('startTime')
-        end_date_str = data.get('endTime')
-        batch_number = data.get('batchNumber')  # 获取batch number
+CSV_FIELDNAMES = ['id', 'slave_id', 'batch_number', 'formula_name',
+                  'sequence', 'pressure', 'create_time', 'update_time']
+CSV_CHUNK_SIZE = 1000
+# Arrow record batches / Parquet row groups are worth making much larger
+COLUMNAR_CHUNK_SIZE = 50000
+EXPORT_FORMATS = ('csv', *FORMATS)
 
-        # Convert date strings to datetime objects
-        taipei_tz = pytz.timezone('Asia/Taipei')
-        start_date = datetime.strptime(
-            start_date_str, '%Y-%m-%d %H:%M:%S').replace(tzinfo=taipei_tz)
-        end_date = datetime.strptime(
-            end_date_str, '%Y-%m-%d %H:%M:%S').replace(tzinfo=taipei_tz)
 
-        # Query the database
-        query = db.session.query(FestoHistory).filter(
+def batch_records_query(batch_number, start_date, end_date, chunk_size=CSV_CHUNK_SIZE):
+    # Column tuples instead of ORM entities, streamed from a server-side cursor
+    return (
+        select(*[getattr(FestoHistory, name) for name in CSV_FIELDNAMES])
+        .where(
             FestoHistory.create_time >= start_date,
             FestoHistory.create_time <= end_date,
             FestoHistory.batch_number == batch_number
         )
+        .execution_options(yield_per=chunk_size)
+    )
+
+
+def iter_batch_records_csv(partitions):
+    """Yield the CSV header and then one chunk of rows per fetched partition"""
+    csv_buffer = io.StringIO()
+    writer = csv.writer(csv_buffer)
+    writer.writerow(CSV_FIELDNAMES)
+    for partition in partitions:
+        writer.writerows(batch_rows(partition))
+        yield csv_buffer.getvalue()
+        csv_buffer.seek(0)
+        csv_buffer.truncate(0)
+    if csv_buffer.tell():
+        yield csv_buffer.getvalue()
+
+
+def __open_batch_records_export(data):
+    """Parse an export request and return (content_type, extension, chunk generator)"""
+    start_date_str = data.get('startTime')
+    end_date_str = data.get('endTime')
+    batch_number = data.get('batchNumber')  # 获取batch number
+    export_format = data.get('format') or 'csv'
+
+    # Convert date strings to datetime objects
+    taipei_tz = pytz.timezone('Asia/Taipei')
+    start_date = datetime.strptime(
+        start_date_str, '%Y-%m-%d %H:%M:%S').replace(tzinfo=taipei_tz)
+    end_date = datetime.strptime(
+        end_date_str, '%Y-%m-%d %H:%M:%S').replace(tzinfo=taipei_tz)
+
+    if export_format in FORMATS:
+        content_type, extension = FORMATS[export_format]
+        chunk_size = COLUMNAR_CHUNK_SIZE
+    else:
+        content_type, extension = 'text/csv', 'csv'
+        chunk_size = CSV_CHUNK_SIZE
+
+    # Query the database, rows are fetched while the response is streamed.
+    # Rows already moved to the archive come first, they are older than the table
+    result = db.session.execute(
+        batch_records_query(batch_number, start_date, end_date, chunk_size=chunk_size))
+    partitions = itertools.chain(
+        iter_archived_batches(current_app.config.get('HISTORY_ARCHIVE_DIR'), batch_number,
+                              start_date.replace(tzinfo=None), end_date.replace(tzinfo=None),
+                              batch_size=chunk_size),
+        result.partitions())
+    if export_format in FORMATS:
+        chunks = iter_record_batches(partitions, export_format)
+    else:
+        chunks = iter_batch_records_csv(partitions)
+
+    def generate():
+        try:
+            yield from chunks
+        finally:
+            result.close()
+            db.session.close()
+
+    return content_type, extension, generate()
+
+
+def get_batch_records_export(data):
+    try:
+        export_format = data.get('format') or 'csv'
+        if export_format not in EXPORT_FORMATS:
+            return make_response(jsonify({"code": 400, "msg": f"Unknown export format: {export_format}."}), 400)
 
-        batch_records = query.all()
-
-        # Create CSV in memory
-        csv_buffer = io.StringIO()
-        fieldnames = ['id', 'slave_id', 'batch_number', 'formula_name',
-                      'sequence', 'pressure', 'create_time', 'update_time']
-        writer = csv.DictWriter(csv_buffer, fieldnames=fieldnames)
-
-        writer.writeheader()
-        for record in batch_records:
-            writer.writerow({
-                'id': record.id,
-                'slave_id': record.slave_id,
-                'batch_number': record.batch_number,
-                'formula_name': record.formula_name,
-                'sequence': record.sequence,
-                'pressure': record.pressure,
-                'create_time': record.create_time,
-                'update_time': record.update_time,
-            })
+        content_type, extension, chunks = __open_batch_records_export(data)
 
         # Prepare response
-        csv_buffer.seek(0)
-        response = make_response(csv_buffer.getvalue())
-        response.headers['Content-Disposition'] = 'attachment; filename=batch_records.csv'
-        response.headers['Content-Type'] = 'text/csv'
+        response = Response(stream_with_context(chunks))
+        response.headers['Content-Disposition'] = f'attachment; filename=batch_records.{extension}'
+        response.headers['Content-Type'] = content_type
 
         return response
 
@@ -106,12 +156,31 @@ def get_batch_records_csv(data):
         return make_response(jsonify({"code": 500, "msg": "An error occurred."}), 500)
 
 
-def get_festo_history(data):
+def __check_downsample_params(data):
+    """Return an error message for an invalid maxPoints/downsample, None when they are fine"""
+    max_points = data.get('maxPoints')
+    if max_points is not None and (isinstance(max_points, bool) or not str(max_points).isdigit()
+                                   or int(max_points) < 1):
+        return f"maxPoints must be a positive integer: {max_points}."
+    downsample = data.get('downsample') or 'lttb'
+    if downsample not in METHODS:
+        return f"Unknown downsample method: {downsample}."
+    return None
+
+
+def get_festo_history(data, check_cancelled=None):
+    """check_cancelled is called between the slow steps, a background job passes job.check_cancelled"""
+    check_cancelled = check_cancelled or (lambda: None)
     try:
         batch_number = data['batchNumber']
         start_time_str = data['startTime']
         end_time_str = data['endTime']
         time_type = data['type']
+        error = __check_downsample_params(data)
+        if error:
+            return {"code": 400, "msg": error}, 400
+        max_points = data.get('maxPoints')
+        downsample = data.get('downsample') or 'lttb'
 
         taipei_tz = pytz.timezone('Asia/Taipei')
         start_time = datetime.strptime(
@@ -119,40 +188,100 @@ def get_festo_history(data):
         end_time = datetime.strptime(
             end_time_str, '%Y-%m-%d %H:%M:%S').replace(tzinfo=taipei_tz)
 
-        history_list = []
+        if time_type == "hour":
+            date_format_str = '%Y-%m-%d %H'
+            rollup_type = "hour"
+        else:
+            date_format_str = '%Y-%m-%d %H:%i'
+            rollup_type = "minute"
+
         # Assume get_period_list is defined
         time_list = __get_period_list(start_time, end_time)
-
-        for time in time_list:
-            if time_type == "hour":
-                date_format_str = '%Y-%m-%d %H'
+        history_list = [{str(time[0]): []} for time in time_list]
+
+        if time_list:
+            # Aggregate the whole range in one query, the day index keeps
+            # buckets of different periods apart like the per-day queries did.
+            # Periods start on a bucket boundary so a raw sample and the rollup
+            # bucket holding it land in the same period and bucket
+            rollup, truncate = ROLLUPS[rollup_type]
+            range_start = truncate(start_time.replace(tzinfo=None))
+            range_end = range_start + timedelta(days=len(time_list) - 1,
+                                                hours=23, minutes=59, seconds=59)
+            # Samples older than the retention period live in the archive
+            archived = read_archived(current_app.config.get('HISTORY_ARCHIVE_DIR'),
+                                     batch_number, range_start, range_end)
+            archived_range = archived_time_range(archived)
+            check_cancelled()
+
+            # Serve from the minute/hour rollups when they cover the raw samples
+            use_rollup = current_app.config.get('HISTORY_ROLLUP_ENABLED') and rollup_covers(
+                db.session, rollup_type, batch_number, range_start, range_end, archived_range)
+            if use_rollup:
+                time_column = rollup.bucket_time
+                avg_pressure = func.sum(rollup.pressure_sum) / func.sum(rollup.sample_count)
+                samples = func.sum(rollup.sample_count)
+                source_filter = [
+                    rollup.batch_number == batch_number,
+                    time_column.between(range_start, range_end)
+                ]
+                # Missing formulas are stored as '' in the rollups, NULL in the raw rows
+                formula_name = func.nullif(rollup.formula_name, '')
             else:
-                date_format_str = '%Y-%m-%d %H:%i'
+                time_column = FestoHistory.create_time
+                avg_pressure = func.avg(FestoHistory.pressure)
+                samples = func.count(FestoHistory.pressure)
+                source_filter = [
+                    FestoHistory.batch_number == batch_number,
+                    time_column.between(range_start, range_end)
+                ]
+                formula_name = FestoHistory.formula_name
+
+            bucket = func.date_format(time_column, date_format_str)
+            period = func.floor(func.timestampdiff(
+                literal_column('SECOND'), range_start, time_column) / 86400)
 
             result = (
                 db.session.query(
-                    FestoHistory.formula_name.label('formulaName'),
-                    func.avg(FestoHistory.pressure).label('avgPressure'),
-                    func.date_format(FestoHistory.create_time,
-                                     date_format_str).label('time')
-                )
-                .filter(
-                    FestoHistory.batch_number == batch_number,
-                    FestoHistory.create_time.between(time[0], time[1])
-                )
-                .group_by(
-                    FestoHistory.formula_name,
-                    func.date_format(FestoHistory.create_time, date_format_str)
-                )
-                .order_by(
-                    func.date_format(FestoHistory.create_time, date_format_str)
+                    formula_name.label('formulaName'),
+                    avg_pressure.label('avgPressure'),
+                    bucket.label('time'),
+                    period.label('period'),
+                    samples.label('samples')
                 )
+                .filter(*source_filter)
+                .group_by(period, formula_name, bucket)
+                .order_by(bucket)
                 .all()
             )
-
-            result_dict = [row._asdict() for row in result]
-
-            history_list.append({str(time[0]): result_dict})
+            check_cancelled()
+
+            buckets = {
+                (int(row.period), row.formulaName, row.time): (row.avgPressure, row.samples)
+                for row in result
+            }
+            # The rollups already include archived samples, raw data does not
+            if archived_range is not None and not use_rollup:
+                for index, formula, label, total, count in aggregate_archived(
+                        archived, range_start, rollup_type):
+                    avg, samples = buckets.get((index, formula, label), (None, 0))
+                    if count:
+                        if avg is not None:
+                            total += avg * samples
+                        buckets[(index, formula, label)] = (total / (samples + count), samples + count)
+                    elif (index, formula, label) not in buckets:
+                        buckets[(index, formula, label)] = (None, 0)
+
+            for (index, formula, label), (avg, _) in sorted(buckets.items(), key=lambda item: item[0][2]):
+                if 0 <= index < len(time_list):
+                    history_list[index][str(time_list[index][0])].append({
+                        'formulaName': formula,
+                        'avgPressure': avg,
+                        'time': label,
+                    })
+
+        if max_points:
+            history_list = __downsample_history(history_list, int(max_points), downsample)
 
         result = {
             "code": 200,
@@ -161,6 +290,8 @@ def get_festo_history(data):
         }
 
         return result, 200
+    except JobCancelled:
+        raise
     except SQLAlchemyError as e:
         current_app.logger.error(e)
         return {"code": 500, "msg": "Database error."}, 500
@@ -180,3 +311,143 @@ def __get_period_list(startTime, endTime):
         result.append([str(start), str(end)])
 
     return result
+
+
+# LTTB keeps the first and last point plus at least one from the middle
+DOWNSAMPLE_MIN_POINTS = 3
+
+
+def __downsample_history(history_list, max_points, method):
+    """Reduce every period/formula series so the whole response has at most max_points points"""
+    series = []
+    for period in history_list:
+        for key, rows in period.items():
+            by_formula = {}
+            for row in rows:
+                if row['avgPressure'] is not None:
+                    by_formula.setdefault(row['formulaName'], []).append(row)
+            series.append((period, key, list(by_formula.values())))
+
+    sizes = [len(rows) for _, _, groups in series for rows in groups]
+    if sum(sizes) <= max_points:
+        return history_list
+
+    budgets = iter(__share_budget(sizes, max_points, DOWNSAMPLE_MIN_POINTS))
+    for period, key, groups in series:
+        kept = []
+        for rows in groups:
+            budget = next(budgets)
+            if budget >= DOWNSAMPLE_MIN_POINTS:
+                x = np.array([row['time'] for row in rows], dtype='datetime64[m]').astype(np.int64)
+                y = [row['avgPressure'] for row in rows]
+                indices = downsample_indices(x, y, budget, method)
+            else:
+                # Too few points left for this series to downsample, keep its ends
+                indices = np.unique(np.linspace(0, len(rows) - 1, budget).round().astype(np.int64))
+            kept.extend(rows[i] for i in indices)
+        kept.sort(key=lambda row: row['time'])
+        period[key] = kept
+
+    return history_list
+
+
+def __share_budget(sizes, max_points, floor):
+    """
+    Split max_points over the series in proportion to their sizes, the total never
+    exceeds max_points. Every series keeps up to `floor` points only if max_points
+    leaves room for that
+    """
+    if floor * len(sizes) > max_points:
+        floor = 0
+    budgets = [min(size, floor) for size in sizes]
+    remaining = max_points - sum(budgets)
+    extra = [size - budget for size, budget in zip(sizes, budgets)]
+    shares = [remaining * points / sum(extra) for points in extra]
+    budgets = [budget + int(share) for budget, share in zip(budgets, shares)]
+    # Hand out the points lost to rounding down to the largest remainders
+    leftover = max_points - sum(budgets)
+    by_remainder = sorted(range(len(sizes)), key=lambda i: shares[i] - int(shares[i]), reverse=True)
+    for i in by_remainder[:leftover]:
+        budgets[i] += 1
+    return budgets
+
+
+def __run_history_job(job):
+    result, status = get_festo_history(job.params, job.check_cancelled)
+    if status != 200:
+        raise RuntimeError(result['msg'])
+    job.check_cancelled()
+    job.result = result
+
+
+def __run_export_job(job):
+    content_type, extension, chunks = __open_batch_records_export(job.params)
+    # Set before writing so a failed or cancelled job removes the partial file
+    job.result_path = job_manager.result_file(job, extension)
+    try:
+        with open(job.result_path, 'wb') as export_file:
+            for chunk in chunks:
+                job.check_cancelled()
+                export_file.write(chunk.encode() if isinstance(chunk, str) else chunk)
+                job.progress = export_file.tell()
+    finally:
+        chunks.close()
+    job.content_type = content_type
+    job.filename = f'batch_records.{extension}'
+
+
+JOB_RUNNERS = {
+    'history': __run_history_job,
+    'export': __run_export_job,
+}
+
+
+def submit_history_job(data):
+    try:
+        kind = data.get('kind')
+        runner = JOB_RUNNERS.get(kind)
+        if runner is None:
+            return {"code": 400, "msg": f"Unknown job kind: {kind}."}, 400
+        error = __check_downsample_params(data) if kind == 'history' else None
+        if error:
+            return {"code": 400, "msg": error}, 400
+        export_format = data.get('format') or 'csv'
+        if kind == 'export' and export_format not in EXPORT_FORMATS:
+            return {"code": 400, "msg": f"Unknown export format: {export_format}."}, 400
+
+        job = job_manager.submit(current_app._get_current_object(), kind, data, runner)
+        if job is None:
+            return {"code": 429, "msg": "Too many jobs, try again later."}, 429
+
+        return {"code": 202, "msg": "Job accepted", "data": job.to_dict()}, 202
+
+    except Exception as e:
+        current_app.logger.error(e)
+        return {"code": 500, "msg": "An error occurred."}, 500
+
+
+def get_history_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return {"code": 404, "msg": "Job not found."}, 404
+    return {"code": 200, "msg": "Success", "data": job.to_dict()}, 200
+
+
+def get_history_job_result(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return make_response(jsonify({"code": 404, "msg": "Job not found."}), 404)
+    if job.status != SUCCEEDED:
+        return make_response(jsonify({"code": 409, "msg": f"Job is {job.status}."}), 409)
+
+    if job.result_path:
+        return send_file(job.result_path, mimetype=job.content_type,
+                         as_attachment=True, download_name=job.filename)
+    return make_response(jsonify(job.result), 200)
+
+
+def cancel_history_job(job_id):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return {"code": 404, "msg": "Job not found."}, 404
+    return {"code": 200, "msg": "Job cancelled", "data": job.to_dict()}, 200
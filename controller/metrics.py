@@ -0,0 +1,104 @@
+from flask import Response, current_app, jsonify, make_response
+from modules.tick_profiler import tick_profiler
+from modules.history_writer import history_writer
+from modules.jobs import job_manager
+from modules.broadcaster import festo_broadcaster
+
+PREFIX = "autoclave"
+
+# Stats keys that are point-in-time values; every other key is a running counter
+GAUGES = {"latency_avg", "latency_max", "connected", "buffered", "clients", "degraded"}
+
+
+def get_metrics():
+    try:
+        lines = []
+
+        __summary(lines, "tick_duration_seconds", "Duration of one perform_schedule tick",
+                  [({}, tick_profiler.tick_duration)])
+        __summary(lines, "tick_lateness_seconds", "Delay between a tick's scheduled and actual start",
+                  [({}, tick_profiler.tick_lateness)])
+        __summary(lines, "tick_phase_duration_seconds", "Duration of each phase within a tick",
+                  [({"phase": phase}, histogram)
+                   for phase, histogram in sorted(tick_profiler.phase_durations.items())])
+        __summary(lines, "slave_io_duration_seconds", "Duration of one Modbus read or write per slave",
+                  [({"gateway": gateway, "slave": slave_id, "op": op}, histogram)
+                   for (gateway, slave_id, op), histogram
+                   in sorted(tick_profiler.slave_durations.items(), key=lambda item: str(item[0]))])
+
+        counters = dict(tick_profiler.counters)
+        __counter(lines, "ticks_total", "Ticks run", counters["ticks"])
+        __counter(lines, "tick_overruns_total",
+                  "Ticks that took longer than the schedule interval", counters["overruns"])
+        __counter(lines, "ticks_missed_total", "Ticks skipped because the previous one overran",
+                  counters["missed"])
+        __counter(lines, "tick_errors_total", "Ticks that raised an error", counters["errors"])
+
+        for name, (fn, label) in tick_profiler.stats_sources.items():
+            stats = fn()
+            if label:
+                __stats(lines, name, [({label: value}, item) for value, item in sorted(stats.items())])
+            else:
+                __stats(lines, name, [({}, stats)])
+        __stats(lines, "history_writer", [({}, history_writer.get_stats())])
+        __stats(lines, "stream", [({}, festo_broadcaster.get_stats())])
+
+        lines.append(f"# HELP {PREFIX}_jobs Background jobs by status")
+        lines.append(f"# TYPE {PREFIX}_jobs gauge")
+        for status, count in job_manager.get_stats().items():
+            lines.append(f"{PREFIX}_jobs{__labels({'status': status})} {count}")
+
+        return Response("\n".join(lines) + "\n", content_type="text/plain; version=0.0.4; charset=utf-8")
+
+    except Exception as e:
+        current_app.logger.error(e)
+        return make_response(jsonify({"code": 500, "msg": "An error occurred."}), 500)
+
+
+def __labels(labels):
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def __summary(lines, name, help_text, series):
+    name = f"{PREFIX}_{name}"
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} summary")
+    for labels, histogram in series:
+        for quantile, value in histogram.quantiles().items():
+            lines.append(f"{name}{__labels({**labels, 'quantile': quantile})} {value:.6f}")
+        lines.append(f"{name}_sum{__labels(labels)} {histogram.total:.6f}")
+        lines.append(f"{name}_count{__labels(labels)} {histogram.count}")
+
+
+def __counter(lines, name, help_text, value):
+    name = f"{PREFIX}_{name}"
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} counter")
+    lines.append(f"{name} {value}")
+
+
+def __stats(lines, prefix, series):
+    # series: [(labels, get_stats() dict)]; only numbers and booleans are exported
+    metrics = {}
+    for labels, stats in series:
+        for key, value in stats.items():
+            if not isinstance(value, (int, float)):
+                continue
+            name = f"{PREFIX}_{prefix}_{key}"
+            if key in GAUGES:
+                kind = "gauge"
+            else:
+                name, kind = (name if name.endswith("_total") else f"{name}_total"), "counter"
+            metrics.setdefault(name, (kind, []))[1].append((labels, value))
+
+    for name, (kind, samples) in metrics.items():
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            value = repr(float(value)) if isinstance(value, float) else int(value)
+            lines.append(f"{name}{__labels(labels)} {value}")
@@ -3,6 +3,7 @@ from models.model import Schedule, ScheduleDetail, FormulaMain, FestoMain, Pid
 from models.shared import db
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime, timedelta
+from modules.schedule_cache import schedule_cache
 
 
 def create(data):
@@ -52,6 +53,7 @@ def create(data):
         # Add the new ScheduleMain object to the database session
         db.session.add(new_schedule_main)
         db.session.commit()
+        schedule_cache.invalidate()
 
         # Build the result to return
         result = {"code": 201, "msg": "Success", "id": new_schedule_main.id}
@@ -146,6 +148,7 @@ def update(schedule_id, data):
 
         # Commit the changes to the database
         db.session.commit()
+        schedule_cache.invalidate()
 
         # Build the result to return
         result = {"code": 200, "msg": "Success", "id": schedule.id}
@@ -200,6 +203,7 @@ def update_detail(schedule_detail_id, data):
 
         # Commit the changes to the database
         db.session.commit()
+        schedule_cache.invalidate()
 
         # Build the result to return
         result = {"code": 200, "msg": "Success", "id": schedule_detail.id}
@@ -242,6 +246,7 @@ def update_multi_detail(data):
                 schedule_detail.check_pressure = check_pressure
 
         db.session.commit()
+        schedule_cache.invalidate()
 
         result = {"code": 200, "msg": "Success"}
         return result, 200
@@ -274,6 +279,7 @@ def delete(schedule_id):
         # Delete the schedule itself
         db.session.delete(schedule)
         db.session.commit()
+        schedule_cache.invalidate()
 
         # Build the result to return
         result = {"code": 200, "msg": "Schedule deleted successfully"}
@@ -0,0 +1,25 @@
+"""
+gunicorn 設定 (SERVER_MODE=wsgi)
+
+排程、排程快取、歷史寫入緩衝與 /festo/stream 都在同一個行程內，
+所以只能有一個 worker，以 gthread 的執行緒處理並行的請求。
+多個 worker 會重複執行排程並讓各自的快取不一致。
+"""
+import os
+
+bind = f"0.0.0.0:{int(os.getenv('PORT', 5002))}"
+worker_class = "gthread"
+workers = 1
+threads = int(os.getenv('WEB_THREADS', 32))
+# 每個 /festo/stream 連線在連線期間一直佔用一個執行緒，
+# 至少保留一半的執行緒給其他 API (包含長時間的 CSV/Arrow 匯出)
+stream_clients = int(os.getenv('STREAM_MAX_CLIENTS', 8))
+if stream_clients > threads // 2:
+    raise RuntimeError(
+        f"STREAM_MAX_CLIENTS={stream_clients} leaves too few of WEB_THREADS={threads} "
+        f"for other requests, lower it to {threads // 2} or raise WEB_THREADS")
+# gthread worker 只用 timeout 檢查 worker 是否卡住，長時間的 SSE 連線不受影響
+timeout = int(os.getenv('WEB_TIMEOUT', 120))
+keepalive = int(os.getenv('WEB_KEEPALIVE', 5))
+accesslog = None
+errorlog = "-"
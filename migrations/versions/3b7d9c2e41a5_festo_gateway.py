@@ -0,0 +1,35 @@
+"""festo_gateway
+
+Revision ID: 3b7d9c2e41a5
+Revises: e6c792fd3f7f
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7d9c2e41a5'
+down_revision = 'e6c792fd3f7f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('festo_main', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('gateway_host', sa.String(length=50), nullable=True))
+        batch_op.add_column(sa.Column('gateway_port', sa.Integer(), nullable=True))
+
+    # slave id 只在同一個閘道內唯一
+    with op.batch_alter_table('festo_current_detail', schema=None) as batch_op:
+        batch_op.drop_constraint('slave_id', type_='unique')
+
+
+def downgrade():
+    with op.batch_alter_table('festo_current_detail', schema=None) as batch_op:
+        batch_op.create_unique_constraint('slave_id', ['slave_id'])
+
+    with op.batch_alter_table('festo_main', schema=None) as batch_op:
+        batch_op.drop_column('gateway_port')
+        batch_op.drop_column('gateway_host')
@@ -0,0 +1,30 @@
+"""festo_history_indexes
+
+Revision ID: 8f2a6d41c0b3
+Revises: 3b7d9c2e41a5
+Create Date: 2026-10-18 10:05:12.532907
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f2a6d41c0b3'
+down_revision = '3b7d9c2e41a5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('festo_history', schema=None) as batch_op:
+        batch_op.create_index('ix_festo_history_batch_number_create_time',
+                              ['batch_number', 'create_time'], unique=False)
+        batch_op.create_index('ix_festo_history_create_time',
+                              ['create_time'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('festo_history', schema=None) as batch_op:
+        batch_op.drop_index('ix_festo_history_create_time')
+        batch_op.drop_index('ix_festo_history_batch_number_create_time')
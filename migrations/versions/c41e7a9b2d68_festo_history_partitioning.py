@@ -0,0 +1,75 @@
+"""festo_history_partitioning
+
+Revision ID: c41e7a9b2d68
+Revises: 8f2a6d41c0b3
+Create Date: 2026-10-18 14:20:37.118204
+
+Only applied when HISTORY_PARTITION_MODE is day or month and the database is
+MySQL; otherwise this revision is a no-op. Partitioning requires create_time
+to be part of the primary key, so the key becomes (id, create_time).
+Rows without create_time are backfilled from update_time; if any remain the
+upgrade aborts before changing the table.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from flask import current_app
+from datetime import datetime
+from modules.history_partition import (
+    FUTURE_PARTITION, MODES, TABLE, ensure_future_partitions, period_start, to_days)
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41e7a9b2d68'
+down_revision = '8f2a6d41c0b3'
+branch_labels = None
+depends_on = None
+
+
+def _partition_mode():
+    bind = op.get_bind()
+    mode = current_app.config.get('HISTORY_PARTITION_MODE')
+    if bind.dialect.name != 'mysql' or mode not in MODES:
+        return None
+    return mode
+
+
+def upgrade():
+    mode = _partition_mode()
+    if mode is None:
+        return
+
+    # 分區鍵不可為 NULL: 先以 update_time 補上，仍有 NULL 時中止，
+    # 避免 MODIFY 失敗或在非 strict 模式下被改成 '0000-00-00' 而落入錯誤的分區
+    bind = op.get_bind()
+    op.execute(
+        f"UPDATE {TABLE} SET create_time = update_time "
+        f"WHERE create_time IS NULL AND update_time IS NOT NULL")
+    missing = bind.execute(
+        sa.text(f"SELECT COUNT(*) FROM {TABLE} WHERE create_time IS NULL")).scalar()
+    if missing:
+        raise RuntimeError(
+            f"{missing} {TABLE} rows have no create_time or update_time. Set create_time "
+            f"or delete them (DELETE FROM {TABLE} WHERE create_time IS NULL), then rerun "
+            f"the upgrade.")
+
+    # 既有資料全部放在 p_start，過期後整個分區刪除
+    start = to_days(period_start(mode, datetime.now()))
+    op.execute(f"ALTER TABLE {TABLE} MODIFY create_time DATETIME NOT NULL")
+    op.execute(f"ALTER TABLE {TABLE} DROP PRIMARY KEY, ADD PRIMARY KEY (id, create_time)")
+    op.execute(
+        f"ALTER TABLE {TABLE} PARTITION BY RANGE (TO_DAYS(create_time)) ("
+        f"PARTITION p_start VALUES LESS THAN ({start}), "
+        f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN MAXVALUE)"
+    )
+    ensure_future_partitions(
+        op.get_bind(), mode, current_app.config.get('HISTORY_PARTITION_AHEAD', 7))
+
+
+def downgrade():
+    if _partition_mode() is None:
+        return
+
+    op.execute(f"ALTER TABLE {TABLE} REMOVE PARTITIONING")
+    op.execute(f"ALTER TABLE {TABLE} DROP PRIMARY KEY, ADD PRIMARY KEY (id)")
+    op.execute(f"ALTER TABLE {TABLE} MODIFY create_time DATETIME NULL")
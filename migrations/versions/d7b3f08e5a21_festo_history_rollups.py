@@ -0,0 +1,62 @@
+"""festo_history_rollups
+
+Revision ID: d7b3f08e5a21
+Revises: c41e7a9b2d68
+Create Date: 2026-10-18 15:02:44.603117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7b3f08e5a21'
+down_revision = 'c41e7a9b2d68'
+branch_labels = None
+depends_on = None
+
+ROLLUPS = (
+    ('festo_history_minute', '%Y-%m-%d %H:%i:00'),
+    ('festo_history_hour', '%Y-%m-%d %H:00:00'),
+)
+
+
+def upgrade():
+    for table, bucket_format in ROLLUPS:
+        op.create_table(
+            table,
+            sa.Column('id', sa.Integer(), nullable=False),
+            # 唯一鍵的欄位，沒有批次號碼或配方時存成 ''，沒有步驟時存成 -1
+            sa.Column('batch_number', sa.String(length=50), nullable=False, server_default=''),
+            sa.Column('formula_name', sa.String(length=50), nullable=False, server_default=''),
+            sa.Column('sequence', sa.Integer(), nullable=False, server_default='-1'),
+            sa.Column('bucket_time', sa.DateTime(), nullable=False),
+            sa.Column('pressure_sum', sa.Float(), nullable=False),
+            sa.Column('pressure_min', sa.Float(), nullable=True),
+            sa.Column('pressure_max', sa.Float(), nullable=True),
+            sa.Column('sample_count', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('batch_number', 'bucket_time', 'formula_name', 'sequence',
+                                name=f'uq_{table}_bucket')
+        )
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.create_index(f'ix_{table}_bucket_time', ['bucket_time'], unique=False)
+
+        # 以既有的原始資料建立彙總
+        op.execute(
+            f"INSERT INTO {table} (batch_number, formula_name, sequence, bucket_time, "
+            f"pressure_sum, pressure_min, pressure_max, sample_count) "
+            f"SELECT COALESCE(batch_number, ''), COALESCE(formula_name, ''), "
+            f"COALESCE(sequence, -1), DATE_FORMAT(create_time, '{bucket_format}'), "
+            f"SUM(pressure), MIN(pressure), MAX(pressure), COUNT(pressure) "
+            f"FROM festo_history WHERE pressure IS NOT NULL AND create_time IS NOT NULL "
+            f"GROUP BY COALESCE(batch_number, ''), COALESCE(formula_name, ''), "
+            f"COALESCE(sequence, -1), DATE_FORMAT(create_time, '{bucket_format}')"
+        )
+
+
+def downgrade():
+    for table, _ in reversed(ROLLUPS):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(f'ix_{table}_bucket_time')
+        op.drop_table(table)
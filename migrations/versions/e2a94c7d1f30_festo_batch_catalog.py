@@ -0,0 +1,50 @@
+"""festo_batch_catalog
+
+Revision ID: e2a94c7d1f30
+Revises: d7b3f08e5a21
+Create Date: 2026-10-18 16:11:08.274519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2a94c7d1f30'
+down_revision = 'd7b3f08e5a21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'festo_batch_catalog',
+        sa.Column('id', sa.Integer(), nullable=False),
+        # 唯一鍵的欄位，沒有批次號碼或配方時存成 ''
+        sa.Column('batch_number', sa.String(length=50), nullable=False, server_default=''),
+        sa.Column('formula_name', sa.String(length=50), nullable=False, server_default=''),
+        sa.Column('first_time', sa.DateTime(), nullable=False),
+        sa.Column('last_time', sa.DateTime(), nullable=False),
+        sa.Column('sample_count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('batch_number', 'formula_name',
+                            name='uq_festo_batch_catalog_batch_formula')
+    )
+    with op.batch_alter_table('festo_batch_catalog', schema=None) as batch_op:
+        batch_op.create_index('ix_festo_batch_catalog_last_time', ['last_time'], unique=False)
+
+    # 以既有的原始資料建立批次目錄
+    op.execute(
+        "INSERT INTO festo_batch_catalog "
+        "(batch_number, formula_name, first_time, last_time, sample_count) "
+        "SELECT COALESCE(batch_number, ''), COALESCE(formula_name, ''), "
+        "MIN(create_time), MAX(create_time), COUNT(*) "
+        "FROM festo_history WHERE create_time IS NOT NULL "
+        "GROUP BY COALESCE(batch_number, ''), COALESCE(formula_name, '')"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('festo_batch_catalog', schema=None) as batch_op:
+        batch_op.drop_index('ix_festo_batch_catalog_last_time')
+    op.drop_table('festo_batch_catalog')
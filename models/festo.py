@@ -1,5 +1,5 @@
 from models.shared import db
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -10,6 +10,9 @@ class FestoMain(db.Model):
     formula_main_id = Column(Integer, ForeignKey('formula_main.id'))
     name = Column(String(length=50))
     slave_id = Column(Integer)
+    # RS485 轉以太網閘道，未設定時使用 FESTO_HOST/FESTO_PORT
+    gateway_host = Column(String(length=50))
+    gateway_port = Column(Integer)
     batch_number = Column(String(length=50), unique=True)
     warning_time = Column(Integer, default=0)
     create_time = Column(DateTime, default=datetime.now)
@@ -25,7 +28,7 @@ class FestoMain(db.Model):
 class FestoCurrentDetail(db.Model):
     __tablename__ = 'festo_current_detail'
     id = Column(Integer, primary_key=True)
-    slave_id = Column(Integer, unique=True)
+    slave_id = Column(Integer)
     pressure = Column(Float)
     create_time = Column(DateTime, default=datetime.now)
     update_time = Column(DateTime, default=datetime.now, onupdate=datetime.now)
@@ -37,6 +40,12 @@ class FestoCurrentDetail(db.Model):
 
 class FestoHistory(db.Model):
     __tablename__ = 'festo_history'
+    # HISTORY_PARTITION_MODE 分區模式下資料庫主鍵為 (id, create_time)，見 migration c41e7a9b2d68
+    __table_args__ = (
+        Index('ix_festo_history_batch_number_create_time',
+              'batch_number', 'create_time'),
+        Index('ix_festo_history_create_time', 'create_time'),
+    )
     id = Column(Integer, primary_key=True)
     slave_id = Column(Integer)
     batch_number = Column(String(length=50))
@@ -45,3 +54,55 @@ class FestoHistory(db.Model):
     pressure = Column(Float)
     create_time = Column(DateTime, default=datetime.now)
     update_time = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+
+class FestoHistoryRollup:
+    """
+    FestoHistory 依批次、配方、步驟與時間區間預先彙總的統計，
+    bucket_time 為區間起始時間，平均值為 pressure_sum / sample_count。
+    唯一鍵的欄位不可為 NULL，沒有批次號碼或配方時為 ''，沒有步驟時為 -1
+    """
+    id = Column(Integer, primary_key=True)
+    batch_number = Column(String(length=50), nullable=False, server_default='')
+    formula_name = Column(String(length=50), nullable=False, server_default='')
+    sequence = Column(Integer, nullable=False, server_default='-1')
+    bucket_time = Column(DateTime, nullable=False)
+    pressure_sum = Column(Float, nullable=False, default=0)
+    pressure_min = Column(Float)
+    pressure_max = Column(Float)
+    sample_count = Column(Integer, nullable=False, default=0)
+
+
+class FestoHistoryMinute(FestoHistoryRollup, db.Model):
+    __tablename__ = 'festo_history_minute'
+    __table_args__ = (
+        UniqueConstraint('batch_number', 'bucket_time', 'formula_name', 'sequence',
+                         name='uq_festo_history_minute_bucket'),
+        Index('ix_festo_history_minute_bucket_time', 'bucket_time'),
+    )
+
+
+class FestoHistoryHour(FestoHistoryRollup, db.Model):
+    __tablename__ = 'festo_history_hour'
+    __table_args__ = (
+        UniqueConstraint('batch_number', 'bucket_time', 'formula_name', 'sequence',
+                         name='uq_festo_history_hour_bucket'),
+        Index('ix_festo_history_hour_bucket_time', 'bucket_time'),
+    )
+
+
+class FestoBatchCatalog(db.Model):
+    """每個批次 (與配方) 的歷史資料摘要，寫入 FestoHistory 時同步更新"""
+    __tablename__ = 'festo_batch_catalog'
+    __table_args__ = (
+        UniqueConstraint('batch_number', 'formula_name',
+                         name='uq_festo_batch_catalog_batch_formula'),
+        Index('ix_festo_batch_catalog_last_time', 'last_time'),
+    )
+    id = Column(Integer, primary_key=True)
+    # 唯一鍵的欄位不可為 NULL (NULL 彼此不相等，upsert 不會合併)，沒有時存成 ''
+    batch_number = Column(String(length=50), nullable=False, server_default='')
+    formula_name = Column(String(length=50), nullable=False, server_default='')
+    first_time = Column(DateTime, nullable=False)
+    last_time = Column(DateTime, nullable=False)
+    sample_count = Column(Integer, nullable=False, default=0)
@@ -1,5 +1,5 @@
 from models.user import User
 from models.formula import FormulaMain, FormulaDetail
 from models.schedule import Schedule, ScheduleDetail
-from models.festo import FestoMain, FestoHistory, FestoCurrentDetail
+from models.festo import FestoMain, FestoHistory, FestoCurrentDetail, FestoHistoryMinute, FestoHistoryHour, FestoBatchCatalog
 from models.pid import Pid
@@ -0,0 +1,52 @@
+from sqlalchemy import func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from models.festo import FestoBatchCatalog
+
+
+def aggregate(rows):
+    """
+    將 FestoHistory 樣本依 (批次, 配方) 彙總成批次目錄的資料列，
+    沒有批次號碼或配方時存成 ''，讓唯一鍵可以合併
+    """
+    batches = {}
+    for row in rows:
+        key = (row["batch_number"] or "", row["formula_name"] or "")
+        create_time = row["create_time"]
+        batch = batches.get(key)
+        if batch is None:
+            batch_number, formula_name = key
+            batches[key] = {
+                "batch_number": batch_number,
+                "formula_name": formula_name,
+                "first_time": create_time,
+                "last_time": create_time,
+                "sample_count": 1,
+            }
+        else:
+            batch["first_time"] = min(batch["first_time"], create_time)
+            batch["last_time"] = max(batch["last_time"], create_time)
+            batch["sample_count"] += 1
+    return list(batches.values())
+
+
+def upsert_batch_catalog(conn, rows):
+    """在寫入 FestoHistory 的同一個交易內更新批次目錄"""
+    if not rows:
+        return
+
+    stmt = mysql_insert(FestoBatchCatalog)
+    stmt = stmt.on_duplicate_key_update(
+        first_time=func.least(FestoBatchCatalog.first_time, stmt.inserted.first_time),
+        last_time=func.greatest(FestoBatchCatalog.last_time, stmt.inserted.last_time),
+        sample_count=FestoBatchCatalog.sample_count + stmt.inserted.sample_count,
+    )
+    conn.execute(stmt, aggregate(rows))
+
+
+def batch_numbers_between(session, start_time, end_time):
+    """返回在 [start_time, end_time] 之間有歷史資料的批次號碼 (沒有批次號碼的資料為 None)"""
+    rows = session.query(FestoBatchCatalog.batch_number).filter(
+        FestoBatchCatalog.first_time <= end_time,
+        FestoBatchCatalog.last_time >= start_time
+    ).distinct().all()
+    return [row.batch_number or None for row in rows]
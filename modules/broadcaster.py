@@ -0,0 +1,97 @@
+import json
+import queue
+import threading
+
+
+class Broadcaster:
+    def __init__(self, max_clients=8, queue_size=10, keepalive=15):
+        """
+        Server-Sent Events 廣播
+
+        排程每個 tick 只序列化一次資料，再放進每個連線的佇列，
+        連線數增加不會增加資料庫或序列化的負擔。
+
+        Args:
+            max_clients: 同時連線數上限
+            queue_size: 每個連線最多暫存的訊息數，消費太慢時丟棄最舊的訊息
+            keepalive: 沒有訊息時每隔幾秒送出註解保持連線
+        """
+        self.max_clients = max_clients
+        self.queue_size = queue_size
+        self.keepalive = keepalive
+        self._clients = set()
+        self._lock = threading.Lock()
+        self._last = None
+        self._event_id = 0
+        self.stats = {"published": 0, "dropped": 0, "rejected": 0}
+
+    def configure(self, max_clients=None, queue_size=None, keepalive=None):
+        if max_clients is not None:
+            self.max_clients = max_clients
+        if queue_size is not None:
+            self.queue_size = queue_size
+        if keepalive is not None:
+            self.keepalive = keepalive
+
+    def publish(self, event, data):
+        """序列化一次後送給所有連線"""
+        with self._lock:
+            self._event_id += 1
+            message = (
+                f"id: {self._event_id}\n"
+                f"event: {event}\n"
+                f"data: {json.dumps(data, default=str, ensure_ascii=False)}\n\n"
+            ).encode()
+            self._last = message
+            clients = list(self._clients)
+            self.stats["published"] += 1
+
+        for client in clients:
+            self._put(client, message)
+
+    def _put(self, client, message):
+        while True:
+            try:
+                client.put_nowait(message)
+                return
+            except queue.Full:
+                try:
+                    client.get_nowait()
+                    self.stats["dropped"] += 1
+                except queue.Empty:
+                    pass
+
+    def subscribe(self):
+        """新增連線，連線數已達上限時返回 None。新連線會先收到最後一次的訊息"""
+        client = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            if len(self._clients) >= self.max_clients:
+                self.stats["rejected"] += 1
+                return None
+            self._clients.add(client)
+            if self._last is not None:
+                client.put_nowait(self._last)
+        return client
+
+    def unsubscribe(self, client):
+        with self._lock:
+            self._clients.discard(client)
+
+    def stream(self, client):
+        """逐一產出連線佇列中的訊息，連線結束時自動取消訂閱"""
+        try:
+            while True:
+                try:
+                    yield client.get(timeout=self.keepalive)
+                except queue.Empty:
+                    yield b": keepalive\n\n"
+        finally:
+            self.unsubscribe(client)
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["clients"] = len(self._clients)
+        return stats
+
+
+festo_broadcaster = Broadcaster()
@@ -0,0 +1,67 @@
+import numpy as np
+
+METHODS = ("lttb", "minmax")
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets 降採樣，返回保留的資料點索引
+
+    第一與最後一點固定保留，其餘資料平均分成 n_out - 2 個區間，
+    每個區間保留與「上一個保留點」及「下一個區間平均點」構成最大三角形面積的點。
+    區間之間有先後依賴，只在區間層級迴圈，區間內以 NumPy 向量化計算。
+    """
+    size = len(x)
+    if n_out >= size or n_out < 3:
+        return np.arange(size)
+
+    # 每個區間的邊界 (不含第一與最後一點)
+    edges = np.linspace(1, size - 1, n_out - 1).astype(np.int64)
+    # 每個區間的平均點，供前一個區間計算面積
+    sums_x = np.add.reduceat(x[1:size - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:size - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    avg_x = np.append(sums_x / counts, x[-1])
+    avg_y = np.append(sums_y / counts, y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = size - 1
+    previous = 0
+    for bucket in range(n_out - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_x, next_y = avg_x[bucket + 1], avg_y[bucket + 1]
+        px, py = x[previous], y[previous]
+        areas = np.abs(
+            (px - next_x) * (y[start:end] - py) - (px - x[start:end]) * (next_y - py)
+        )
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def minmax_indices(x, y, n_out):
+    """
+    每個區間保留最小值與最大值的點，返回排序後的索引，
+    保留尖峰與谷底，適合觀察壓力異常
+    """
+    size = len(x)
+    if n_out >= size or n_out < 2:
+        return np.arange(size)
+
+    buckets = max(n_out // 2, 1)
+    bucket_ids = np.arange(size) * buckets // size
+    # 依 (區間, y) 排序後，每個區間的第一點為最小值、最後一點為最大值
+    order = np.lexsort((y, bucket_ids))
+    starts = np.searchsorted(bucket_ids[order], np.arange(buckets), side="left")
+    ends = np.searchsorted(bucket_ids[order], np.arange(buckets), side="right") - 1
+    return np.unique(np.concatenate((order[starts], order[ends])))
+
+
+def downsample_indices(x, y, n_out, method="lttb"):
+    """依 method 降採樣到最多 n_out 點，返回保留的索引 (遞增)"""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if method == "minmax":
+        return minmax_indices(x, y, n_out)
+    return lttb_indices(x, y, n_out)
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import threading
+import time
+
+REDIS_KEY = "autoclave:festo:executing"
+
+
+def build_executing_info(festos, timeline, current_time):
+    """/festo/executing 的資料: 有配方的設備與其執行中 (或時間上最接近) 的排程步驟"""
+    _, nearest, _ = timeline.lookup(current_time)
+    executing_info = []
+    for festo, index in zip(festos, nearest):
+        detail = timeline.detail(index)
+        if detail is None or festo.formula_name is None:
+            continue
+        executing_info.append({
+            "id": festo.id,
+            "festoName": festo.name,
+            "warningTime": festo.warning_time * 5 / 60,
+            "formulaName": festo.formula_name,
+            "schedulePressure": detail.pressure,
+            "scheduleSequence": detail.sequence,
+            "scheduleStatus": detail.status,
+            "checkPressure": detail.check_pressure,
+        })
+    return executing_info
+
+
+class Snapshot:
+    """已序列化的回應內容，建立後不再修改，可同時提供給多個請求"""
+    __slots__ = ("body", "etag", "version", "publish_time")
+
+    def __init__(self, body, etag, version, publish_time):
+        self.body = body
+        self.etag = etag
+        self.version = version
+        self.publish_time = publish_time
+
+
+def make_snapshot(data, version=None):
+    """將 API 資料序列化為 {"code", "msg", "data"} 回應內容並計算 ETag"""
+    body = json.dumps({"code": 200, "msg": "Success", "data": data},
+                      default=str, separators=(",", ":")).encode()
+    etag = hashlib.sha1(body).hexdigest()
+    return Snapshot(body, etag, version, time.time())
+
+
+class ExecutingSnapshot:
+    def __init__(self, max_age=15):
+        """
+        /festo/executing 的快照
+
+        排程每個 tick 結束後發佈一次，序列化與 ETag 只計算一次，
+        API 直接返回快照，內容未改變的輪詢以 304 回應。
+        設定 REDIS_URL 時同時寫入 Redis 供外部系統讀取；API 只使用行程內的快照，
+        每個行程都有自己的排程與版本號，Redis 中其他行程的快照無法判斷是否過期。
+
+        Args:
+            max_age: 快照的最長有效秒數，排程停止時 API 改為自行計算
+        """
+        self.max_age = max_age
+        self._snapshot = None
+        self._redis = None
+        self._lock = threading.Lock()
+
+    def configure(self, max_age=None, redis_url=None):
+        if max_age is not None:
+            self.max_age = max_age
+        if redis_url:
+            # 只有設定 REDIS_URL 時才需要 redis 套件
+            import redis
+            self._redis = redis.Redis.from_url(redis_url, socket_timeout=1)
+
+    def publish(self, data, version=None):
+        """
+        發佈新的快照
+
+        Args:
+            data: build_executing_info 的結果
+            version: 建立快照時的排程快取版本號
+        """
+        snapshot = make_snapshot(data, version)
+        with self._lock:
+            self._snapshot = snapshot
+
+        if self._redis is not None:
+            try:
+                self._redis.set(REDIS_KEY, json.dumps({
+                    "body": snapshot.body.decode(),
+                    "etag": snapshot.etag,
+                    "version": snapshot.version,
+                    "publishTime": snapshot.publish_time,
+                }), ex=max(int(self.max_age), 1))
+            except Exception as e:
+                print(f"Publish executing snapshot to redis failed: {e}")
+        return snapshot
+
+    def get(self, version=None):
+        """
+        返回仍有效的快照，沒有時返回 None
+
+        Args:
+            version: 目前的排程快取版本號，與快照不同時視為過期
+        """
+        snapshot = self._snapshot
+        if snapshot is not None \
+                and time.time() - snapshot.publish_time <= self.max_age \
+                and (version is None or snapshot.version == version):
+            return snapshot
+        return None
+
+
+executing_snapshot = ExecutingSnapshot()
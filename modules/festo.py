@@ -1,90 +1,221 @@
 import os
+import time
+from typing import NamedTuple
 from pymodbus.client import ModbusTcpClient
+from modules.tick_profiler import tick_profiler
+
+
+# 暫存器配置
+# Holding Register 0: 設定壓力, 3-6: PID (kp, ki, kd, step)
+# Input Register 1: 真空壓力, 2: 腔室壓力
+HOLDING_START, HOLDING_COUNT = 0, 7
+INPUT_START, INPUT_COUNT = 1, 2
+
+
+def encode_pressure(pressure):
+    """壓力 (kPa) 轉換為暫存器值"""
+    return int((pressure + 100) * 100)
+
+
+def decode_pressure(value):
+    """暫存器值轉換為壓力 (kPa)"""
+    return round(value / 100 - 100, 2)
+
+
+class FestoSnapshot(NamedTuple):
+    """單一 slave 一次批次讀取的結果"""
+    slave_id: int
+    vacuum_pressure: float
+    chamber_pressure: float
+    set_pressure: float = None
+    set_pressure_raw: int = None
+    kp: int = None
+    ki: int = None
+    kd: int = None
+    step: int = None
+
+    @classmethod
+    def from_registers(cls, slave_id, input_registers, holding_registers=None):
+        vacuum_raw, chamber_raw = input_registers[:2]
+        snapshot = cls(
+            slave_id=slave_id,
+            vacuum_pressure=decode_pressure(vacuum_raw),
+            chamber_pressure=chamber_raw / 100,
+        )
+        if holding_registers is None:
+            return snapshot
+        set_raw, _, _, kp, ki, kd, step = holding_registers[:HOLDING_COUNT]
+        return snapshot._replace(
+            set_pressure=decode_pressure(set_raw),
+            set_pressure_raw=set_raw,
+            kp=kp, ki=ki, kd=kd, step=step,
+        )
+
+    def pid(self):
+        return {"kp": self.kp, "ki": self.ki, "kd": self.kd, "step": self.step}
 
 
 class festo:
-    def __init__(self, host, port=502):
+    def __init__(self, host, port=502, timeout=5, retries=3,
+                 keepalive_interval=0, probe_device_id=None,
+                 backoff_base=0.5, backoff_max=30):
         """
         初始化 Festo 連接（透過 Modbus/TCP）
-        
+
+        連線建立後會長期保持，只有在請求失敗或閒置探測失敗時才重新連線，
+        重新連線失敗時以指數退避延後下一次嘗試。
+
         Args:
             host: RS485 轉以太網設備的 IP 位址
             port: TCP 連接埠 (預設 502)
+            timeout: 單次請求逾時秒數
+            retries: pymodbus 內部重試次數
+            keepalive_interval: 閒置超過此秒數後，下一次請求前先做存活探測 (0 代表停用)
+            probe_device_id: 存活探測使用的 slave id (None 代表使用該次請求的 slave id)
+            backoff_base: 重新連線失敗後的初始等待秒數
+            backoff_max: 重新連線等待秒數上限
         """
         self.host = host
         self.port = port
-        self.client = ModbusTcpClient(host, port=port, timeout=5, retries=3)
-        self._connect()
-
-    def _ensure_connection(self):
-        """
-        確保連線處於可用狀態；如果被閒置斷線則重新連線。
-        返回 bool 代表目前是否可用。
-        """
-        if self.client and getattr(self.client, "connected", False):
-            return True
-        return self._connect()
-    
-    def _connect(self):
-        """建立連接"""
-        try:
-            if self.client and self.client.connected:
-                return True
-            
-            # 嘗試連接
-            result = self.client.connect()
-            
+        self.keepalive_interval = keepalive_interval
+        self.probe_device_id = probe_device_id
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.client = ModbusTcpClient(
+            host, port=port, timeout=timeout, retries=retries)
+
+        self._backoff = 0
+        self._next_connect_at = 0
+        self._last_io_at = 0
+        self.stats = {
+            "connects": 0,
+            "reconnects": 0,
+            "connect_failures": 0,
+            "requests": 0,
+            "failures": 0,
+            "probes": 0,
+            "latency_total": 0.0,
+            "latency_max": 0.0,
+        }
+        self._connect()
+
+    def _ensure_connection(self):
+        """
+        確保連線處於可用狀態；如果被閒置斷線則重新連線。
+        返回 bool 代表目前是否可用。
+        """
+        if self.client and getattr(self.client, "connected", False):
+            return True
+        return self._connect()
+
+    def _connect(self):
+        """建立連接，失敗時依指數退避決定下一次可嘗試的時間"""
+        if self.client is None:
+            return False
+        if self.client.connected:
+            return True
+
+        # 仍在退避期間內，直接放棄，避免每次請求都卡在 TCP 逾時
+        if time.monotonic() < self._next_connect_at:
+            return False
+
+        try:
             # pymodbus 的 connect() 通常返回 True 或拋出異常
-            # 如果沒有拋出異常，我們認為連接成功
-            if result is True or result is None:  # 有些版本返回 None
-                # 額外驗證連接是否真的有效
-                if hasattr(self.client, 'connected') and self.client.connected:
-                    print(f"✓ Successfully connected to {self.host}:{self.port}")
-                    return True
-                else:
-                    print(f"✗ Connection established but not confirmed")
-                    return False
-            else:
-                print(f"✗ Failed to connect to {self.host}:{self.port}")
-                return False
-                
-        except Exception as e:
-            print(f"✗ Connection error: {e}")
-            return False
-    
-    def _call(self, fn, *args, **kwargs):
-        """
-        統一的 Modbus 調用包裝，先確保連線，失敗才重連（無 heartbeat）。
-        為避免閒置後的半開連線，每次操作前都刷新連線。
-        """
-        # 避免半開連線：先關閉舊 socket，再重新建立
-        if self.client:
-            self.client.close()
-        if not self._connect():
-            print("Modbus operation failed: connection not available")
-            return None
-        try:
-            # 直接嘗試操作，不預先檢查連接
-            resp = fn(*args, **kwargs)
-            if resp.isError():
-                raise IOError(f"Modbus error: {resp}")
-            return resp
-        except Exception as e:
-            # 收到斷線後，先嘗試重新連線再重試，不預先噴錯
-            if self.client:
-                self.client.close()
-            if self._connect():
-                try:
-                    print("Retrying operation after reconnect...")
-                    resp = fn(*args, **kwargs)
-                    if resp.isError():
-                        raise IOError(f"Modbus error after reconnect: {resp}")
-                    print("✓ Operation succeeded after reconnect")
-                    return resp
-                except Exception as e2:
-                    print(f"Retry after reconnect also failed: {e2}")
-            print(f"Modbus operation failed: {e}")
-            return None
+            result = self.client.connect()
+            if (result is True or result is None) and self.client.connected:
+                if self.stats["connects"]:
+                    self.stats["reconnects"] += 1
+                self.stats["connects"] += 1
+                self._backoff = 0
+                self._next_connect_at = 0
+                self._last_io_at = time.monotonic()
+                print(f"✓ Successfully connected to {self.host}:{self.port}")
+                return True
+            print(f"✗ Failed to connect to {self.host}:{self.port}")
+        except Exception as e:
+            print(f"✗ Connection error: {e}")
+
+        self.stats["connect_failures"] += 1
+        self._backoff = min(
+            self.backoff_max, self._backoff * 2 if self._backoff else self.backoff_base)
+        self._next_connect_at = time.monotonic() + self._backoff
+        return False
+
+    def _reconnect(self):
+        """關閉目前 socket 並立即重新連線（不受退避限制）"""
+        if self.client:
+            self.client.close()
+        self._next_connect_at = 0
+        return self._connect()
+
+    def _probe(self, device_id):
+        """閒置過久時以讀取一個 Holding Register 確認連線仍然存活"""
+        self.stats["probes"] += 1
+        try:
+            resp = self.client.read_holding_registers(
+                address=0, count=1, device_id=device_id)
+            return not resp.isError()
+        except Exception:
+            return False
+
+    def _request(self, fn, *args, **kwargs):
+        """送出單次請求並記錄延遲，回應錯誤時拋出 IOError"""
+        started = time.monotonic()
+        self.stats["requests"] += 1
+        try:
+            resp = fn(*args, **kwargs)
+        finally:
+            elapsed = time.monotonic() - started
+            self.stats["latency_total"] += elapsed
+            self.stats["latency_max"] = max(self.stats["latency_max"], elapsed)
+        if resp.isError():
+            raise IOError(f"Modbus error: {resp}")
+        self._last_io_at = time.monotonic()
+        return resp
+
+    def _call(self, fn, *args, **kwargs):
+        """
+        統一的 Modbus 調用包裝，重複使用長連線。
+        請求失敗時才關閉 socket、重新連線並重試一次；
+        若啟用 keepalive_interval，閒置過久的連線會先探測一次。
+        """
+        if not self._connect():
+            print("Modbus operation failed: connection not available")
+            return None
+
+        if self.keepalive_interval and \
+                time.monotonic() - self._last_io_at > self.keepalive_interval:
+            device_id = self.probe_device_id
+            if device_id is None:
+                device_id = kwargs.get("device_id", 1)
+            if not self._probe(device_id) and not self._reconnect():
+                print("Modbus operation failed: keepalive probe failed")
+                return None
+
+        try:
+            return self._request(fn, *args, **kwargs)
+        except Exception as e:
+            self.stats["failures"] += 1
+            # 可能是半開連線，重新連線後再重試一次
+            if self._reconnect():
+                try:
+                    print("Retrying operation after reconnect...")
+                    resp = self._request(fn, *args, **kwargs)
+                    print("✓ Operation succeeded after reconnect")
+                    return resp
+                except Exception as e2:
+                    self.stats["failures"] += 1
+                    print(f"Retry after reconnect also failed: {e2}")
+            print(f"Modbus operation failed: {e}")
+            return None
+
+    def get_stats(self):
+        """回傳連線與延遲統計"""
+        stats = dict(self.stats)
+        stats["latency_avg"] = (
+            stats["latency_total"] / stats["requests"] if stats["requests"] else 0.0)
+        stats["connected"] = bool(self.client and self.client.connected)
+        return stats
 
     def readSetPressure(self, id):
         """讀取設定壓力 (Holding Register 0)"""
@@ -95,7 +226,7 @@ class festo:
         if rr is None:
             return None
         value = rr.registers[0]
-        return round(value / 100 - 100, 2)
+        return decode_pressure(value)
 
     def readVacuumPressure(self, id):
         """讀取真空壓力 (Input Register 1)"""
@@ -106,7 +237,7 @@ class festo:
         if ri is None:
             return None
         value = ri.registers[0]
-        return round(value / 100 - 100, 2)
+        return decode_pressure(value)
 
     def readChamberPressure(self, id):
         """讀取腔室壓力 (Input Register 2)"""
@@ -130,9 +261,63 @@ class festo:
         kp, ki, kd, step = rr.registers
         return {"kp": kp, "ki": ki, "kd": kd, "step": step}
 
+    def read_snapshot(self, slave_id, holding=True):
+        """
+        批次讀取單一 slave 的所有暫存器：
+        Input Registers 1-2 與 Holding Registers 0-6 各一次請求，
+        取代 readVacuumPressure/readChamberPressure/readSetPressure/readMulti 四次請求。
+
+        Args:
+            slave_id: 設備 slave id
+            holding: False 時只讀 Input Registers (一次請求)
+
+        Returns:
+            FestoSnapshot，讀取失敗時返回 None
+        """
+        ri = self._call(
+            self.client.read_input_registers,
+            address=INPUT_START, count=INPUT_COUNT, device_id=slave_id
+        )
+        if ri is None:
+            return None
+        if not holding:
+            return FestoSnapshot.from_registers(slave_id, ri.registers)
+
+        rr = self._call(
+            self.client.read_holding_registers,
+            address=HOLDING_START, count=HOLDING_COUNT, device_id=slave_id
+        )
+        if rr is None:
+            return None
+        return FestoSnapshot.from_registers(slave_id, ri.registers, rr.registers)
+
+    def read_snapshots(self, slave_ids, holding=False):
+        """依序讀取多個 slave，返回 {slave_id: FestoSnapshot | None}"""
+        snapshots = {}
+        for slave_id in dict.fromkeys(slave_ids):
+            started = time.monotonic()
+            snapshots[slave_id] = self.read_snapshot(slave_id, holding)
+            tick_profiler.observe_slave(
+                f"{self.host}:{self.port}", slave_id, "read", time.monotonic() - started)
+        return snapshots
+
+    def write_pressures(self, writes):
+        """依序寫入 [(slave_id, pressure), ...]，返回每筆是否成功"""
+        results = []
+        for slave_id, pressure in writes:
+            started = time.monotonic()
+            results.append(self.writePressure(slave_id, pressure))
+            tick_profiler.observe_slave(
+                f"{self.host}:{self.port}", slave_id, "write", time.monotonic() - started)
+        return results
+
     def writePressure(self, id, pressure):
         """寫入目標壓力 (Holding Register 0)"""
-        value = int((pressure + 100) * 100)
+        value = encode_pressure(pressure)
+        if not 0 <= value <= 0xFFFF:
+            # 超出 16-bit 暫存器範圍，不送出請求也不觸發重新連線
+            print(f"Pressure {pressure} out of register range ({value}), skip writing to device {id}")
+            return False
         print(f"Writing pressure: {pressure} -> register value: {value} to device {id}")
         wr = self._call(
             self.client.write_register,
@@ -201,9 +386,13 @@ if __name__ == "__main__":
                 step = int(input("請輸入 Step:"))
                 result = festoObj.writeMulti(id, kp, ki, kd, step)
                 print('Write multi result: %s' % result)
+            elif inputText == 'snapshot':
+                print(festoObj.read_snapshot(id))
             elif inputText == 'readsetpressure':
                 result = festoObj.readSetPressure(id)
                 print(result)
+            elif inputText == 'stats':
+                print(festoObj.get_stats())
             elif inputText == 'exit':
                 festoObj.close()
                 break
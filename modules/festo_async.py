@@ -0,0 +1,290 @@
+import asyncio
+import threading
+import time
+from pymodbus.client import AsyncModbusTcpClient
+from modules.festo import (
+    FestoSnapshot, encode_pressure,
+    HOLDING_START, HOLDING_COUNT, INPUT_START, INPUT_COUNT,
+)
+from modules.tick_profiler import tick_profiler
+
+
+class ModbusResponseError(Exception):
+    """設備回應 Modbus 錯誤碼，連線本身仍然可用"""
+
+
+class festo_poller:
+    def __init__(self, host, port=502, timeout=5, retries=0,
+                 pipeline_depth=1, device_deadline=2.0, healthy_deadline=0.3,
+                 batch_deadline=2.5, backoff_base=0.5, backoff_max=30):
+        """
+        以 asyncio Modbus/TCP client 同時輪詢多個 slave
+
+        事件迴圈在背景執行緒中長期運行，對外提供同步介面，
+        讓排程控制迴圈的執行緒可以直接呼叫。
+
+        Args:
+            host: RS485 轉以太網設備的 IP 位址
+            port: TCP 連接埠 (預設 502)
+            timeout: pymodbus 單次請求逾時秒數
+            retries: pymodbus 內部重試次數 (交給 device_deadline 控制，預設 0)
+            pipeline_depth: 對同一個閘道同時開啟的連線數，
+                            閘道允許多連線時可同時送出多個請求
+            device_deadline: 尚未輪詢過的 slave 讀寫的最長等待秒數，逾時視為讀取失敗
+            healthy_deadline: 輪詢過的 slave 讀寫的最長等待秒數，應大於最慢的正常設備的
+                              回應時間；離線的設備每次只佔用這麼久 (0 代表使用 device_deadline)
+            batch_deadline: 一次 read_snapshots / write_pressures 整批的最長等待秒數，
+                            時間到仍未完成的 slave 視為失敗 (0 代表不限制)
+            backoff_base: 重新連線或 slave 失敗後的初始等待秒數
+            backoff_max: 重新連線或 slave 失敗後的等待秒數上限
+
+        失敗的 slave 以指數退避暫停輪詢，恢復後排在正常與尚未輪詢過的設備之後，
+        離線的設備不會拖慢同一閘道上正常設備的讀寫。
+        """
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.retries = retries
+        self.pipeline_depth = max(1, int(pipeline_depth))
+        self.device_deadline = device_deadline
+        self.healthy_deadline = healthy_deadline
+        self.batch_deadline = batch_deadline
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stats = {
+            "connects": 0,
+            "reconnects": 0,
+            "connect_failures": 0,
+            "requests": 0,
+            "failures": 0,
+            "deadline_misses": 0,
+            "batch_deadline_misses": 0,
+            "backoff_skips": 0,
+            "latency_total": 0.0,
+            "latency_max": 0.0,
+        }
+
+        # slave_id -> (連續失敗次數, 下次可再嘗試的 monotonic 時間)，上次成功為 (0, 0)
+        self._slave_backoff = {}
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever,
+            name=f"festo-poller-{host}:{port}", daemon=True)
+        self._thread.start()
+        self._slots = self._run(self._create_slots())
+
+    def _run(self, coro, timeout=None):
+        """在背景事件迴圈執行 coroutine 並等待結果"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    def _submit(self, coro):
+        """在背景事件迴圈執行 coroutine，返回 concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    async def _create_slots(self):
+        # client 必須在事件迴圈內建立
+        return [{
+            "client": AsyncModbusTcpClient(
+                self.host, port=self.port, timeout=self.timeout,
+                retries=self.retries, reconnect_delay=0),
+            "backoff": 0,
+            "next_connect_at": 0,
+            "connected_once": False,
+        } for _ in range(self.pipeline_depth)]
+
+    async def _connect(self, slot):
+        client = slot["client"]
+        if client.connected:
+            return True
+        if time.monotonic() < slot["next_connect_at"]:
+            return False
+        try:
+            if await client.connect() and client.connected:
+                if slot["connected_once"]:
+                    self.stats["reconnects"] += 1
+                slot["connected_once"] = True
+                self.stats["connects"] += 1
+                slot["backoff"] = 0
+                slot["next_connect_at"] = 0
+                return True
+        except Exception as e:
+            print(f"✗ Connection error: {e}")
+        self.stats["connect_failures"] += 1
+        slot["backoff"] = min(
+            self.backoff_max, slot["backoff"] * 2 if slot["backoff"] else self.backoff_base)
+        slot["next_connect_at"] = time.monotonic() + slot["backoff"]
+        return False
+
+    async def _request(self, slot, fn_name, **kwargs):
+        started = time.monotonic()
+        self.stats["requests"] += 1
+        try:
+            resp = await getattr(slot["client"], fn_name)(**kwargs)
+        finally:
+            elapsed = time.monotonic() - started
+            self.stats["latency_total"] += elapsed
+            self.stats["latency_max"] = max(self.stats["latency_max"], elapsed)
+        if resp.isError():
+            raise ModbusResponseError(f"Modbus error: {resp}")
+        return resp
+
+    async def _read_one(self, slot, slave_id, holding):
+        ri = await self._request(
+            slot, "read_input_registers",
+            address=INPUT_START, count=INPUT_COUNT, device_id=slave_id)
+        if not holding:
+            return FestoSnapshot.from_registers(slave_id, ri.registers)
+        rr = await self._request(
+            slot, "read_holding_registers",
+            address=HOLDING_START, count=HOLDING_COUNT, device_id=slave_id)
+        return FestoSnapshot.from_registers(slave_id, ri.registers, rr.registers)
+
+    async def _write_one(self, slot, slave_id, pressure):
+        value = encode_pressure(pressure)
+        if not 0 <= value <= 0xFFFF:
+            print(f"Pressure {pressure} out of register range ({value}), skip writing to device {slave_id}")
+            return False
+        await self._request(
+            slot, "write_register", address=0, value=value, device_id=slave_id)
+        return True
+
+    def _slave_failed(self, slave_id):
+        failures = self._slave_backoff.get(slave_id, (0, 0))[0] + 1
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (failures - 1))
+        self._slave_backoff[slave_id] = (failures, time.monotonic() + delay)
+
+    async def _guarded(self, slot, slave_id, deadline, coro_fn, *args):
+        """在 deadline 秒內完成單一 slave 的操作，失敗返回 None"""
+        if not await self._connect(slot):
+            return None
+        try:
+            result = await asyncio.wait_for(
+                coro_fn(slot, slave_id, *args), deadline)
+            self._slave_backoff[slave_id] = (0, 0)
+            return result
+        except asyncio.CancelledError:
+            # 整批超過 batch_deadline 被取消，請求可能還在連線上，關閉後下次重新連線
+            self._slave_failed(slave_id)
+            slot["client"].close()
+            raise
+        except asyncio.TimeoutError:
+            self.stats["deadline_misses"] += 1
+            print(f"Modbus deadline exceeded for device {slave_id}")
+        except ModbusResponseError as e:
+            # 只有設備回應錯誤碼時保留連線，其他錯誤 (含 socket 的 OSError) 一律重新連線
+            self.stats["failures"] += 1
+            print(f"Modbus operation failed for device {slave_id}: {e}")
+            return None
+        except Exception as e:
+            print(f"Modbus operation failed for device {slave_id}: {e}")
+        self.stats["failures"] += 1
+        self._slave_failed(slave_id)
+        # 逾時後連線上可能還有遲到的回應，socket 錯誤後連線也不能再用，關閉後下次重新連線
+        slot["client"].close()
+        return None
+
+    async def _run_all(self, jobs, coro_fn, op):
+        """
+        將 (slave_id, args) 工作分配給 pipeline_depth 條連線同時執行，
+        每條連線依序處理自己的佇列。op ("read"/"write") 為記錄每個 slave 耗時的分類
+
+        退避中的 slave 直接略過，其餘依上次成功、尚未輪詢過、失敗過的順序處理。
+        輪詢過的 slave 只等待 healthy_deadline，剛離線或退避後重試的設備不會用完整批的時間；
+        整批超過 batch_deadline 時取消剩下的工作，未完成的 slave 結果為 None
+        """
+        healthy_deadline = min(self.healthy_deadline or self.device_deadline, self.device_deadline)
+        now = time.monotonic()
+        pending = []
+        for index, (slave_id, args) in enumerate(jobs):
+            state = self._slave_backoff.get(slave_id)
+            if state is not None and now < state[1]:
+                self.stats["backoff_skips"] += 1
+                continue
+            priority = 1 if state is None else (0 if state[0] == 0 else state[0] + 1)
+            pending.append((priority, index, slave_id, args))
+        pending.sort(key=lambda job: job[0])
+
+        queue = asyncio.Queue()
+        for priority, index, slave_id, args in pending:
+            deadline = self.device_deadline if priority == 1 else healthy_deadline
+            queue.put_nowait((index, (slave_id, deadline, args)))
+        results = [None] * len(jobs)
+
+        async def worker(slot):
+            while not queue.empty():
+                index, (slave_id, deadline, args) = queue.get_nowait()
+                started = time.monotonic()
+                results[index] = await self._guarded(slot, slave_id, deadline, coro_fn, *args)
+                tick_profiler.observe_slave(
+                    f"{self.host}:{self.port}", slave_id, op, time.monotonic() - started)
+
+        workers = asyncio.gather(*(worker(slot) for slot in self._slots))
+        if not self.batch_deadline:
+            await workers
+            return results
+        try:
+            await asyncio.wait_for(workers, self.batch_deadline)
+        except asyncio.TimeoutError:
+            self.stats["batch_deadline_misses"] += 1
+            print(f"Modbus batch deadline exceeded on {self.host}:{self.port}, "
+                  f"{queue.qsize()} device(s) not polled")
+        return results
+
+    async def _read_all(self, slave_ids, holding):
+        slave_ids = list(dict.fromkeys(slave_ids))
+        results = await self._run_all(
+            [(slave_id, (holding,)) for slave_id in slave_ids], self._read_one, "read")
+        return dict(zip(slave_ids, results))
+
+    async def _write_all(self, writes):
+        results = await self._run_all(
+            [(slave_id, (pressure,)) for slave_id, pressure in writes], self._write_one, "write")
+        return [bool(result) for result in results]
+
+    def submit_snapshots(self, slave_ids, holding=False):
+        """非同步送出讀取，返回結果為 {slave_id: FestoSnapshot | None} 的 Future"""
+        return self._submit(self._read_all(slave_ids, holding))
+
+    def read_snapshots(self, slave_ids, holding=False):
+        """同時讀取多個 slave，返回 {slave_id: FestoSnapshot | None}"""
+        return self.submit_snapshots(slave_ids, holding).result()
+
+    def read_snapshot(self, slave_id, holding=True):
+        return self.read_snapshots([slave_id], holding).get(slave_id)
+
+    def submit_pressures(self, writes):
+        """非同步寫入 [(slave_id, pressure), ...]，返回結果為 [bool, ...] 的 Future"""
+        return self._submit(self._write_all(list(writes)))
+
+    def write_pressures(self, writes):
+        """同時寫入多個 slave 的目標壓力，返回每筆是否成功"""
+        return self.submit_pressures(writes).result()
+
+    def writePressure(self, id, pressure):
+        return self.write_pressures([(id, pressure)])[0]
+
+    def readVacuumPressure(self, id):
+        snapshot = self.read_snapshot(id, holding=False)
+        return snapshot.vacuum_pressure if snapshot else None
+
+    def get_stats(self):
+        """回傳連線與延遲統計"""
+        stats = dict(self.stats)
+        stats["latency_avg"] = (
+            stats["latency_total"] / stats["requests"] if stats["requests"] else 0.0)
+        stats["connected"] = any(slot["client"].connected for slot in self._slots)
+        return stats
+
+    def close(self):
+        """關閉所有連線並停止事件迴圈"""
+        if not self._loop.is_running():
+            return
+
+        async def _close():
+            for slot in self._slots:
+                slot["client"].close()
+
+        self._run(_close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
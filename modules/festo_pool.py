@@ -0,0 +1,118 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class festo_pool:
+    def __init__(self, default_host, default_port, factory, max_gateways=16):
+        """
+        依閘道 (host, port) 管理 Festo 連線，每個閘道一條長連線 (或一組 poller)，
+        不同閘道之間平行輪詢。
+
+        Args:
+            default_host: FestoMain 沒有指定閘道時使用的 host (FESTO_HOST)
+            default_port: FestoMain 沒有指定閘道時使用的 port (FESTO_PORT)
+            factory: factory(host, port) 建立單一閘道的連線物件
+                     (modules.festo.festo 或 modules.festo_async.festo_poller)
+            max_gateways: 同時平行處理的閘道數上限
+        """
+        self.default_host = default_host
+        self.default_port = default_port
+        self.factory = factory
+        self._conns = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_gateways, thread_name_prefix="festo-gateway")
+
+    def gateway_key(self, host=None, port=None):
+        """將未設定的 host/port 補上預設值"""
+        return (host or self.default_host, int(port or self.default_port))
+
+    def get(self, host=None, port=None):
+        """取得 (必要時建立) 指定閘道的連線"""
+        key = self.gateway_key(host, port)
+        with self._lock:
+            conn = self._conns.get(key)
+            if conn is None:
+                conn = self.factory(*key)
+                self._conns[key] = conn
+            return conn
+
+    def _map_gateways(self, grouped, fn):
+        """對每個閘道平行執行 fn(conn, items)，返回 {gateway_key: result}"""
+        futures = {
+            key: self._executor.submit(fn, self.get(*key), items)
+            for key, items in grouped.items()
+        }
+        results = {}
+        for key, future in futures.items():
+            try:
+                results[key] = future.result()
+            except Exception as e:
+                print(f"Gateway {key[0]}:{key[1]} failed: {e}")
+                results[key] = None
+        return results
+
+    def read_snapshots(self, targets, holding=False):
+        """
+        平行讀取多個閘道上的 slave
+
+        Args:
+            targets: [(gateway_key, slave_id), ...]
+
+        Returns:
+            {(gateway_key, slave_id): FestoSnapshot | None}
+        """
+        grouped = {}
+        for key, slave_id in targets:
+            grouped.setdefault(self.gateway_key(*key), []).append(slave_id)
+
+        results = self._map_gateways(
+            grouped, lambda conn, slave_ids: conn.read_snapshots(slave_ids, holding))
+
+        snapshots = {}
+        for key, slave_ids in grouped.items():
+            gateway_result = results.get(key) or {}
+            for slave_id in slave_ids:
+                snapshots[(key, slave_id)] = gateway_result.get(slave_id)
+        return snapshots
+
+    def write_pressures(self, writes):
+        """
+        平行寫入多個閘道上的 slave
+
+        Args:
+            writes: [(gateway_key, slave_id, pressure), ...]
+
+        Returns:
+            [bool, ...]，與 writes 順序相同，閘道失敗時該閘道的寫入皆為 False
+        """
+        grouped = {}
+        positions = []
+        for key, slave_id, pressure in writes:
+            key = self.gateway_key(*key)
+            items = grouped.setdefault(key, [])
+            positions.append((key, len(items)))
+            items.append((slave_id, pressure))
+
+        results = self._map_gateways(
+            grouped, lambda conn, items: conn.write_pressures(items))
+
+        written = []
+        for key, index in positions:
+            gateway_result = results.get(key) or []
+            written.append(index < len(gateway_result) and bool(gateway_result[index]))
+        return written
+
+    def get_stats(self):
+        """回傳各閘道的連線統計，key 為 host:port"""
+        with self._lock:
+            conns = dict(self._conns)
+        return {f"{host}:{port}": conn.get_stats() for (host, port), conn in conns.items()}
+
+    def close(self):
+        with self._lock:
+            conns = list(self._conns.values())
+            self._conns.clear()
+        for conn in conns:
+            conn.close()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,157 @@
+import os
+import time
+from datetime import timedelta
+from urllib.parse import quote
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from sqlalchemy import delete, select
+from models.festo import FestoHistory
+from modules.history_arrow import HISTORY_SCHEMA, record_batch
+
+ARCHIVE_COLUMNS = [getattr(FestoHistory, field.name) for field in HISTORY_SCHEMA]
+
+
+def batch_dir(archive_dir, month, batch_number):
+    """封存檔目錄: <archive_dir>/month=YYYY-MM/batch=<批次號碼>"""
+    return os.path.join(archive_dir, f"month={month}",
+                        f"batch={quote(batch_number or '', safe='')}")
+
+
+def _write_parquet(path, rows):
+    """先寫入暫存檔再改名，重新執行時同名檔案直接覆蓋"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    pq.write_table(pa.Table.from_batches([record_batch(rows)]), tmp_path, compression="zstd")
+    os.replace(tmp_path, path)
+
+
+def archive_history(engine, cutoff, archive_dir, chunk_size=100000, sleep=0.0):
+    """
+    將 create_time <= cutoff 的歷史資料依批次寫成 Parquet 封存檔後刪除
+
+    每個批次以 (batch_number, create_time) 索引依時間取出最多 chunk_size 筆，
+    依月份寫成 part-<第一筆id>-<最後一筆id>.parquet，寫入成功後才在同一個短交易中刪除。
+    中途失敗時資料仍在資料表內，重新執行會取出相同的資料列並覆蓋同名檔案。
+
+    Returns:
+        (封存筆數, 檔案數, 花費秒數)
+    """
+    started = time.monotonic()
+    with engine.connect() as conn:
+        batch_numbers = conn.execute(
+            select(FestoHistory.batch_number)
+            .where(FestoHistory.create_time <= cutoff)
+            .distinct()
+        ).scalars().all()
+
+    total = 0
+    files = 0
+    for batch_number in batch_numbers:
+        rows_stmt = (
+            select(*ARCHIVE_COLUMNS)
+            .where(FestoHistory.batch_number == batch_number,
+                   FestoHistory.create_time <= cutoff)
+            .order_by(FestoHistory.create_time, FestoHistory.id)
+            .limit(chunk_size)
+        )
+        while True:
+            with engine.begin() as conn:
+                rows = conn.execute(rows_stmt).all()
+                if not rows:
+                    break
+
+                months = {}
+                for row in rows:
+                    months.setdefault(row.create_time.strftime("%Y-%m"), []).append(row)
+                for month, month_rows in months.items():
+                    ids = [row.id for row in month_rows]
+                    _write_parquet(os.path.join(
+                        batch_dir(archive_dir, month, batch_number),
+                        f"part-{min(ids):012d}-{max(ids):012d}.parquet"), month_rows)
+                    files += 1
+
+                conn.execute(delete(FestoHistory).where(
+                    FestoHistory.id.in_([row.id for row in rows])))
+            total += len(rows)
+            if len(rows) < chunk_size:
+                break
+            if sleep:
+                time.sleep(sleep)
+
+    return total, files, time.monotonic() - started
+
+
+def _months(start_time, end_time):
+    month = start_time.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    while month <= end_time:
+        yield month.strftime("%Y-%m")
+        month = (month + timedelta(days=32)).replace(day=1)
+
+
+def archived_dataset(archive_dir, batch_number, start_time, end_time):
+    """返回範圍內該批次封存檔的 dataset 與過濾條件，沒有封存檔時返回 (None, None)"""
+    if not archive_dir:
+        return None, None
+
+    paths = []
+    for month in _months(start_time, end_time):
+        directory = batch_dir(archive_dir, month, batch_number)
+        if os.path.isdir(directory):
+            paths.extend(sorted(
+                os.path.join(directory, name) for name in os.listdir(directory)
+                if name.endswith(".parquet")))
+    if not paths:
+        return None, None
+
+    dataset = ds.dataset(paths, format="parquet", schema=HISTORY_SCHEMA)
+    condition = (ds.field("create_time") >= pa.scalar(start_time, type=pa.timestamp("us"))) & \
+        (ds.field("create_time") <= pa.scalar(end_time, type=pa.timestamp("us")))
+    return dataset, condition
+
+
+def read_archived(archive_dir, batch_number, start_time, end_time):
+    """讀取範圍內該批次的封存資料，返回 pyarrow Table 或 None"""
+    dataset, condition = archived_dataset(archive_dir, batch_number, start_time, end_time)
+    if dataset is None:
+        return None
+    return dataset.to_table(filter=condition)
+
+
+def archived_time_range(table):
+    """返回封存資料的 (最早, 最晚) create_time，沒有資料時返回 None"""
+    if table is None or table.num_rows == 0:
+        return None
+    bounds = pc.min_max(table.column("create_time")).as_py()
+    return bounds["min"], bounds["max"]
+
+
+def iter_archived_batches(archive_dir, batch_number, start_time, end_time, batch_size=50000):
+    """逐批產出範圍內該批次的封存資料 (RecordBatch)"""
+    dataset, condition = archived_dataset(archive_dir, batch_number, start_time, end_time)
+    if dataset is None:
+        return
+    for batch in dataset.to_batches(filter=condition, batch_size=batch_size):
+        if batch.num_rows:
+            yield batch
+
+
+def aggregate_archived(table, range_start, time_type):
+    """
+    依 (期間, 配方, 時間區間) 彙總封存資料，期間以 range_start 起每 86400 秒計算，
+    與 get_festo_history 的 SQL 彙總相同。返回 [(期間, 配方, 時間字串, 壓力總和, 筆數)]
+    """
+    create_time = table.column("create_time")
+    label_format = "%Y-%m-%d %H" if time_type == "hour" else "%Y-%m-%d %H:%M"
+    seconds = create_time.cast(pa.timestamp("s")).cast(pa.int64()).to_numpy(zero_copy_only=False)
+    start = pa.scalar(range_start, type=pa.timestamp("s")).value
+    grouped = pa.table({
+        "period": (seconds - start) // 86400,
+        "formula_name": table.column("formula_name"),
+        "time": pc.strftime(create_time, format=label_format),
+        "pressure": table.column("pressure"),
+    }).group_by(["period", "formula_name", "time"]).aggregate(
+        [("pressure", "sum"), ("pressure", "count")])
+    return list(zip(*(grouped.column(name).to_pylist() for name in
+                      ("period", "formula_name", "time", "pressure_sum", "pressure_count"))))
@@ -0,0 +1,95 @@
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# FestoHistory 欄位對應的 Arrow 型別，順序與 controller.history.CSV_FIELDNAMES 相同
+HISTORY_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("slave_id", pa.int32()),
+    ("batch_number", pa.string()),
+    ("formula_name", pa.string()),
+    ("sequence", pa.int32()),
+    ("pressure", pa.float64()),
+    ("create_time", pa.timestamp("us")),
+    ("update_time", pa.timestamp("us")),
+])
+
+FORMATS = {
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def record_batch(rows, schema=HISTORY_SCHEMA):
+    """將查詢結果的資料列 (tuple) 轉置成欄位後建立 RecordBatch"""
+    if isinstance(rows, pa.RecordBatch):
+        return rows
+    columns = list(zip(*rows)) if rows else [()] * len(schema)
+    return pa.RecordBatch.from_arrays(
+        [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+        schema=schema)
+
+
+def batch_rows(partition):
+    """RecordBatch 轉回資料列 (tuple)，查詢結果的資料列直接返回"""
+    if isinstance(partition, pa.RecordBatch):
+        return zip(*(column.to_pylist() for column in partition.columns))
+    return partition
+
+
+class ChunkSink:
+    """
+    只保存尚未送出資料的輸出檔案，
+    writer 寫入後以 drain() 取出位元組送給客戶端，tell() 仍返回累計位置供 Parquet footer 使用
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def open_writer(sink, fmt, schema=HISTORY_SCHEMA):
+    if fmt == "parquet":
+        return pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema, compression="zstd")
+    return pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), schema,
+                             options=pa.ipc.IpcWriteOptions(compression="zstd"))
+
+
+def iter_record_batches(partitions, fmt, schema=HISTORY_SCHEMA):
+    """
+    將每個 partition 寫成一個 Arrow record batch (Parquet 則為一個 row group)，
+    每寫完一批就產出目前累積的位元組
+    """
+    sink = ChunkSink()
+    writer = open_writer(sink, fmt, schema)
+    try:
+        for rows in partitions:
+            writer.write_batch(record_batch(rows, schema))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    data = sink.drain()
+    if data:
+        yield data
@@ -0,0 +1,110 @@
+from datetime import date, datetime, timedelta
+from sqlalchemy import text
+
+TABLE = "festo_history"
+FUTURE_PARTITION = "p_future"
+MODES = ("day", "month")
+
+
+def to_days(value):
+    """與 MySQL TO_DAYS() 相同的日數"""
+    if isinstance(value, datetime):
+        value = value.date()
+    return value.toordinal() + 365
+
+
+def period_start(mode, value):
+    if isinstance(value, datetime):
+        value = value.date()
+    if mode == "month":
+        return value.replace(day=1)
+    return value
+
+
+def next_period(mode, start):
+    if mode == "month":
+        return (start.replace(day=1) + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def partition_name(mode, start):
+    return start.strftime("p%Y%m" if mode == "month" else "p%Y%m%d")
+
+
+def partition_definitions(mode, start, until):
+    """
+    產生 [start, until) 之間每個期間的分區定義，
+    每個分區存放該期間的資料，上界為下一個期間的 TO_DAYS
+    """
+    definitions = []
+    current = period_start(mode, start)
+    while current < until:
+        upper = next_period(mode, current)
+        definitions.append(
+            f"PARTITION {partition_name(mode, current)} VALUES LESS THAN ({to_days(upper)})")
+        current = upper
+    return definitions
+
+
+def list_partitions(conn):
+    """
+    返回 festo_history 的分區 [(名稱, 上界 TO_DAYS 或 None)]，
+    資料表未分區時返回空串列
+    """
+    rows = conn.execute(text(
+        "SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL "
+        "ORDER BY PARTITION_ORDINAL_POSITION"
+    ), {"table": TABLE}).all()
+    return [
+        (name, None if description == "MAXVALUE" else int(description))
+        for name, description in rows
+    ]
+
+
+def is_partitioned(conn):
+    if conn.dialect.name != "mysql":
+        return False
+    return bool(list_partitions(conn))
+
+
+def ensure_future_partitions(conn, mode, ahead, now=None):
+    """
+    將 p_future 拆分出到 now 之後 ahead 個期間為止的分區，
+    p_future 正常情況下沒有資料，REORGANIZE 幾乎不需搬移資料。
+    返回新增的分區數
+    """
+    now = now or datetime.now()
+    until = period_start(mode, now)
+    for _ in range(ahead + 1):
+        until = next_period(mode, until)
+
+    partitions = list_partitions(conn)
+    bounded = [upper for _, upper in partitions if upper is not None]
+    start = date.fromordinal(max(bounded) - 365) if bounded else period_start(mode, now)
+    definitions = partition_definitions(mode, start, until)
+    if not definitions:
+        return 0
+
+    definitions.append(f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN MAXVALUE")
+    conn.execute(text(
+        f"ALTER TABLE {TABLE} REORGANIZE PARTITION {FUTURE_PARTITION} INTO ("
+        + ", ".join(definitions) + ")"
+    ))
+    return len(definitions) - 1
+
+
+def drop_expired_partitions(conn, cutoff):
+    """
+    刪除上界不超過 cutoff 當天的分區 (分區內資料全部早於 cutoff)。
+    跨越 cutoff 的分區保留到下次整個過期時再刪除。
+    返回被刪除的分區名稱
+    """
+    limit = to_days(cutoff)
+    expired = [
+        name for name, upper in list_partitions(conn)
+        if upper is not None and upper <= limit
+    ]
+    if expired:
+        conn.execute(text(f"ALTER TABLE {TABLE} DROP PARTITION {', '.join(expired)}"))
+    return expired
@@ -0,0 +1,41 @@
+import time
+from sqlalchemy import delete, select
+from models.festo import FestoHistory
+
+
+def purge_history(engine, cutoff, chunk_size=5000, sleep=0.0, time_column=FestoHistory.create_time):
+    """
+    分批刪除 time_column <= cutoff 的歷史資料 (預設為 festo_history.create_time)
+
+    每批先以時間欄位的索引取出最多 chunk_size 筆 id，再依 id 刪除，
+    每批在獨立的短交易中執行，
+    避免一次載入所有資料或長時間鎖住資料表，
+    批次之間可暫停 sleep 秒讓排程的寫入先進行。
+
+    Returns:
+        (刪除筆數, 批次數, 花費秒數)
+    """
+    started = time.monotonic()
+    model = time_column.class_
+    id_stmt = (
+        select(model.id)
+        .where(time_column <= cutoff)
+        .limit(chunk_size)
+    )
+
+    total = 0
+    chunks = 0
+    while True:
+        with engine.begin() as conn:
+            ids = conn.execute(id_stmt).scalars().all()
+            deleted = conn.execute(
+                delete(model).where(model.id.in_(ids))
+            ).rowcount if ids else 0
+        chunks += 1
+        total += deleted
+        if deleted < chunk_size:
+            break
+        if sleep:
+            time.sleep(sleep)
+
+    return total, chunks, time.monotonic() - started
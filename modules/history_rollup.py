@@ -0,0 +1,106 @@
+from sqlalchemy import func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from models.festo import FestoHistory, FestoHistoryMinute, FestoHistoryHour
+
+
+def truncate_minute(value):
+    return value.replace(second=0, microsecond=0)
+
+
+def truncate_hour(value):
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+# 彙總表唯一鍵的欄位不可為 NULL，沒有步驟時存成 NO_SEQUENCE (步驟從 0 開始)
+NO_SEQUENCE = -1
+
+# get_festo_history 的 type 對應的彙總表與時間截斷方式
+ROLLUPS = {
+    "minute": (FestoHistoryMinute, truncate_minute),
+    "hour": (FestoHistoryHour, truncate_hour),
+}
+
+
+def aggregate(rows, truncate):
+    """
+    將 FestoHistory 樣本依 (批次, 配方, 步驟, 區間) 彙總成彙總表的資料列，
+    沒有批次號碼或配方時存成 ''、沒有步驟時存成 NO_SEQUENCE，讓唯一鍵可以合併
+    """
+    buckets = {}
+    for row in rows:
+        sequence = row["sequence"]
+        key = (row["batch_number"] or "", row["formula_name"] or "",
+               NO_SEQUENCE if sequence is None else sequence,
+               truncate(row["create_time"]))
+        pressure = row["pressure"]
+        bucket = buckets.get(key)
+        if bucket is None:
+            batch_number, formula_name, sequence, bucket_time = key
+            buckets[key] = {
+                "batch_number": batch_number,
+                "formula_name": formula_name,
+                "sequence": sequence,
+                "bucket_time": bucket_time,
+                "pressure_sum": pressure,
+                "pressure_min": pressure,
+                "pressure_max": pressure,
+                "sample_count": 1,
+            }
+        else:
+            bucket["pressure_sum"] += pressure
+            bucket["pressure_min"] = min(bucket["pressure_min"], pressure)
+            bucket["pressure_max"] = max(bucket["pressure_max"], pressure)
+            bucket["sample_count"] += 1
+    return list(buckets.values())
+
+
+def upsert_rollups(conn, rows):
+    """
+    在寫入 FestoHistory 的同一個交易內累加分鐘與小時彙總表，
+    同一區間已存在時以 ON DUPLICATE KEY UPDATE 合併
+    """
+    pressures = [row for row in rows if row["pressure"] is not None]
+    if not pressures:
+        return
+
+    for model, truncate in ROLLUPS.values():
+        stmt = mysql_insert(model)
+        stmt = stmt.on_duplicate_key_update(
+            pressure_sum=model.pressure_sum + stmt.inserted.pressure_sum,
+            pressure_min=func.least(model.pressure_min, stmt.inserted.pressure_min),
+            pressure_max=func.greatest(model.pressure_max, stmt.inserted.pressure_max),
+            sample_count=model.sample_count + stmt.inserted.sample_count,
+        )
+        conn.execute(stmt, aggregate(pressures, truncate))
+
+
+def rollup_covers(session, time_type, batch_number, start_time, end_time, archived_range=None):
+    """
+    檢查彙總表是否涵蓋該批次在範圍內的原始資料，
+    只比較兩邊最早與最晚的時間，兩個查詢都只需要索引。
+    archived_range 為範圍內封存資料的 (最早, 最晚) 時間，彙總表也必須涵蓋
+    """
+    model, truncate = ROLLUPS[time_type]
+    raw_first, raw_last = session.query(
+        func.min(FestoHistory.create_time), func.max(FestoHistory.create_time)
+    ).filter(
+        FestoHistory.batch_number == batch_number,
+        FestoHistory.create_time.between(start_time, end_time)
+    ).one()
+    if archived_range is not None:
+        archived_first, archived_last = archived_range
+        raw_first = min(raw_first or archived_first, archived_first)
+        raw_last = max(raw_last or archived_last, archived_last)
+    if raw_first is None:
+        return True
+
+    rollup_first, rollup_last = session.query(
+        func.min(model.bucket_time), func.max(model.bucket_time)
+    ).filter(
+        model.batch_number == batch_number,
+        model.bucket_time.between(truncate(start_time), end_time)
+    ).one()
+    if rollup_first is None:
+        return False
+
+    return rollup_first <= truncate(raw_first) and rollup_last >= truncate(raw_last)
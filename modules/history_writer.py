@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from sqlalchemy import insert
+from models.festo import FestoHistory
+from modules.history_rollup import upsert_rollups
+from modules.batch_catalog import upsert_batch_catalog
+
+
+class HistoryWriter:
+    def __init__(self, flush_size=200, flush_interval=30, max_buffer=50000, rollup=True):
+        """
+        FestoHistory 批次寫入器
+
+        排程每個 tick 只把樣本放進記憶體緩衝區，累積 flush_size 筆
+        或距離上次寫入超過 flush_interval 秒時，以單一 executemany INSERT 寫入，
+        並在同一個交易內更新批次目錄。
+
+        Args:
+            flush_size: 緩衝區達到此筆數就寫入
+            flush_interval: 距離上次寫入超過此秒數就寫入 (0 代表每個 tick 都寫入)
+            max_buffer: 緩衝區上限，資料庫無法寫入時丟棄最舊的樣本
+            rollup: 同一個交易內一併更新分鐘與小時彙總表
+        """
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.rollup = rollup
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self.stats = {"added": 0, "written": 0, "dropped": 0, "flushes": 0, "failures": 0}
+
+    def configure(self, flush_size=None, flush_interval=None, max_buffer=None, rollup=None):
+        if flush_size is not None:
+            self.flush_size = flush_size
+        if flush_interval is not None:
+            self.flush_interval = flush_interval
+        if max_buffer is not None:
+            self.max_buffer = max_buffer
+        if rollup is not None:
+            self.rollup = rollup
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def add(self, slave_id, batch_number, formula_name, sequence, pressure, create_time=None):
+        """加入一筆樣本，create_time 預設為目前時間"""
+        create_time = create_time or datetime.now()
+        row = {
+            "slave_id": slave_id,
+            "batch_number": batch_number,
+            "formula_name": formula_name,
+            "sequence": sequence,
+            "pressure": pressure,
+            "create_time": create_time,
+            "update_time": create_time,
+        }
+        with self._lock:
+            self._buffer.append(row)
+            self.stats["added"] += 1
+            self._trim()
+
+    def _trim(self):
+        while len(self._buffer) > self.max_buffer:
+            self._buffer.popleft()
+            self.stats["dropped"] += 1
+
+    def should_flush(self):
+        return len(self._buffer) >= self.flush_size or \
+            time.monotonic() - self._last_flush >= self.flush_interval
+
+    def flush(self, engine):
+        """
+        以獨立的短交易寫入緩衝區內所有樣本，返回寫入筆數。
+        寫入失敗時樣本放回緩衝區並拋出例外。
+        """
+        with self._lock:
+            rows = list(self._buffer)
+            self._buffer.clear()
+            self._last_flush = time.monotonic()
+        if not rows:
+            return 0
+
+        try:
+            with engine.begin() as conn:
+                conn.execute(insert(FestoHistory), rows)
+                upsert_batch_catalog(conn, rows)
+                if self.rollup:
+                    upsert_rollups(conn, rows)
+        except Exception:
+            with self._lock:
+                self._buffer.extendleft(reversed(rows))
+                self._trim()
+                self.stats["failures"] += 1
+            raise
+
+        with self._lock:
+            self.stats["written"] += len(rows)
+            self.stats["flushes"] += 1
+        return len(rows)
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["buffered"] = len(self._buffer)
+        return stats
+
+
+history_writer = HistoryWriter()
@@ -0,0 +1,196 @@
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, kind, params):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.status = QUEUED
+        self.error = None
+        # 結果為 JSON 時存在 result，為檔案時存在 result_path
+        self.result = None
+        self.result_path = None
+        self.content_type = None
+        self.filename = None
+        self.progress = 0
+        self.create_time = time.time()
+        self.start_time = None
+        self.finish_time = None
+        self._cancel = threading.Event()
+        self._future = None
+
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        """長時間執行的工作應定期呼叫，已取消時拋出 JobCancelled"""
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "error": self.error,
+            "createTime": self.create_time,
+            "startTime": self.start_time,
+            "finishTime": self.finish_time,
+        }
+
+
+class JobManager:
+    def __init__(self, max_workers=2, max_pending=100, result_ttl=3600, result_dir=None):
+        """
+        背景工作管理
+
+        以固定大小的執行緒池執行耗時的查詢與匯出，API 只負責建立工作與查詢狀態。
+
+        Args:
+            max_workers: 同時執行的工作數
+            max_pending: 排隊中與執行中的工作數上限，超過時拒絕新的工作
+            result_ttl: 完成的工作保留秒數，過期後刪除結果
+            result_dir: 結果檔案目錄，預設為系統暫存目錄
+        """
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.result_dir = result_dir
+        self._executor = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def configure(self, max_workers=None, max_pending=None, result_ttl=None, result_dir=None):
+        if max_workers is not None:
+            self.max_workers = max_workers
+        if max_pending is not None:
+            self.max_pending = max_pending
+        if result_ttl is not None:
+            self.result_ttl = result_ttl
+        if result_dir is not None:
+            self.result_dir = result_dir
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="job")
+        return self._executor
+
+    def result_file(self, job, extension):
+        """返回工作結果檔案的路徑"""
+        directory = self.result_dir or os.path.join(tempfile.gettempdir(), "autoclave-jobs")
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, f"{job.id}.{extension}")
+
+    def submit(self, app, kind, params, fn):
+        """
+        建立工作並排入執行緒池，fn(job) 在 app context 內執行，
+        返回 Job，工作數已達上限時返回 None
+        """
+        self._expire()
+        job = Job(kind, params)
+        with self._lock:
+            active = sum(1 for item in self._jobs.values() if item.status not in FINISHED)
+            if active >= self.max_pending:
+                return None
+            self._jobs[job.id] = job
+            job._future = self._get_executor().submit(self._run, app, job, fn)
+        return job
+
+    def _run(self, app, job, fn):
+        if job.cancelled():
+            job.finish_time = time.time()
+            job.status = CANCELLED
+            return
+        job.status = RUNNING
+        job.start_time = time.time()
+        status = SUCCEEDED
+        try:
+            with app.app_context():
+                fn(job)
+            job.check_cancelled()
+        except JobCancelled:
+            self._remove_result(job)
+            status = CANCELLED
+        except Exception as e:
+            self._remove_result(job)
+            job.error = str(e)
+            status = FAILED
+            app.logger.error(f"Job {job.id} ({job.kind}) failed: {e}")
+        # finish_time 先於狀態設定，_expire 看到完成狀態時一定有完成時間
+        job.finish_time = time.time()
+        job.status = status
+
+    def get(self, job_id):
+        self._expire()
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """
+        取消工作: 排隊中的工作直接取消，執行中的工作在下一次 check_cancelled 時停止，
+        已完成的工作刪除結果。返回被取消的 Job，不存在時返回 None
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job._cancel.set()
+            if job._future is not None and job._future.cancel():
+                job.finish_time = time.time()
+                job.status = CANCELLED
+            if job.status in FINISHED:
+                self._remove_result(job)
+                del self._jobs[job_id]
+        return job
+
+    def _remove_result(self, job):
+        job.result = None
+        if job.result_path and os.path.exists(job.result_path):
+            os.remove(job.result_path)
+        job.result_path = None
+
+    def _expire(self):
+        now = time.time()
+        with self._lock:
+            expired = [
+                job for job in self._jobs.values()
+                if job.status in FINISHED and now - job.finish_time > self.result_ttl
+            ]
+            for job in expired:
+                self._remove_result(job)
+                del self._jobs[job.id]
+
+    def get_stats(self):
+        with self._lock:
+            stats = {status: 0 for status in (QUEUED, RUNNING) + FINISHED}
+            for job in self._jobs.values():
+                stats[job.status] += 1
+        return stats
+
+    def shutdown(self):
+        with self._lock:
+            for job in self._jobs.values():
+                job._cancel.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+job_manager = JobManager()
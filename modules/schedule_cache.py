@@ -0,0 +1,181 @@
+import threading
+from sqlalchemy import update
+from sqlalchemy.orm import joinedload
+from models.festo import FestoMain, FestoCurrentDetail
+from models.schedule import Schedule, ScheduleDetail
+from modules.schedule_timeline import ScheduleTimeline
+
+
+def load_tick_festos():
+    """
+    一次載入排程所需的所有資料：festo、formula、current detail、schedule 與 schedule details。
+    共兩個查詢 (festo JOIN formula/current detail/schedule + schedule details 的 IN 查詢)，
+    避免每台設備各自 lazy load。
+    """
+    return (
+        FestoMain.query.options(
+            joinedload(FestoMain.formula),
+            joinedload(FestoMain.festo_current_detail),
+            joinedload(FestoMain.schedule).selectinload(Schedule.schedule_details),
+        )
+        .order_by(FestoMain.id)
+        .all()
+    )
+
+
+class CachedDetail:
+    """ScheduleDetail 的記憶體副本，排程只會修改 status 與 reset_times"""
+    __slots__ = ("id", "schedule_id", "sequence", "pressure", "status",
+                 "check_pressure", "process_time", "reset_times",
+                 "time_start", "time_end", "_persisted")
+
+    def __init__(self, detail):
+        self.id = detail.id
+        self.schedule_id = detail.schedule_id
+        self.sequence = detail.sequence
+        self.pressure = detail.pressure
+        self.status = detail.status
+        self.check_pressure = detail.check_pressure
+        self.process_time = detail.process_time
+        self.reset_times = detail.reset_times or 0
+        self.time_start = detail.time_start
+        self.time_end = detail.time_end
+        self._persisted = (self.status, self.reset_times)
+
+    def changes(self):
+        """返回尚未寫回資料庫的欄位，沒有變動時返回 None"""
+        if (self.status, self.reset_times) == self._persisted:
+            return None
+        return {"id": self.id, "status": self.status, "reset_times": self.reset_times}
+
+    def mark_persisted(self):
+        self._persisted = (self.status, self.reset_times)
+
+
+class CachedFesto:
+    """FestoMain 及排程所需關聯的記憶體副本"""
+    __slots__ = ("id", "name", "slave_id", "gateway_host", "gateway_port",
+                 "batch_number", "warning_time", "formula_name", "schedule_id",
+                 "schedule_details", "current_detail_id", "pressure")
+
+    def __init__(self, festo):
+        self.id = festo.id
+        self.name = festo.name
+        self.slave_id = festo.slave_id
+        self.gateway_host = festo.gateway_host
+        self.gateway_port = festo.gateway_port
+        self.batch_number = festo.batch_number
+        self.warning_time = festo.warning_time
+        self.formula_name = festo.formula.name if festo.formula else None
+        self.schedule_id = festo.schedule.id if festo.schedule else None
+        self.schedule_details = sorted(
+            (CachedDetail(detail) for detail in festo.schedule.schedule_details),
+            key=lambda x: x.sequence) if festo.schedule else []
+        current_detail = festo.festo_current_detail
+        self.current_detail_id = current_detail.id if current_detail else None
+        self.pressure = None
+
+
+class ScheduleCache:
+    def __init__(self):
+        """
+        排程狀態的行程內快取
+
+        排程每個 tick 只在記憶體中判斷狀態，status/reset_times 與目前壓力
+        在 tick 結束時一次批次寫回 (write-behind)。
+        controller 修改 festo/schedule/formula 後呼叫 invalidate()，
+        下一個 tick 會重新從資料庫載入。
+        """
+        self._lock = threading.RLock()
+        self._festos = None
+        self._timeline = None
+        self._version = 0
+        self._loaded_version = None
+
+    @property
+    def version(self):
+        return self._version
+
+    def invalidate(self):
+        """資料庫中的排程被修改，下一次 get() 重新載入"""
+        with self._lock:
+            self._version += 1
+
+    def get(self, loader):
+        """
+        取得快取的排程資料，必要時以 loader() 重新載入，
+        重新載入時同時編譯所有設備的排程時間軸
+
+        Args:
+            loader: 返回 FestoMain 列表 (需預先載入關聯) 的函式
+
+        Returns:
+            (CachedFesto 列表, 與列表順序相同的 ScheduleTimeline, 載入時的版本號)
+        """
+        with self._lock:
+            if self._festos is None or self._loaded_version != self._version:
+                version = self._version
+                self._festos = [CachedFesto(festo) for festo in loader()]
+                self._timeline = ScheduleTimeline(
+                    [festo.schedule_details for festo in self._festos])
+                self._loaded_version = version
+            return self._festos, self._timeline, self._loaded_version
+
+    def flush(self, session, festos, loaded_version):
+        """
+        將 tick 中的變動以批次 UPDATE 加入 session，由呼叫端 commit
+
+        若 tick 期間排程已被使用者修改 (版本號改變)，放棄本次的
+        status/reset_times 變動，以使用者的修改為準。
+
+        Args:
+            session: 資料庫 session
+            festos: tick 開始時 get() 取得的 CachedFesto 列表；
+                    tick 期間其他執行緒可能已重新載入快取，必須寫回 tick 實際使用的列表
+            loaded_version: get() 返回的版本號
+        """
+        with self._lock:
+            stale = loaded_version != self._version
+
+            detail_changes = []
+            if not stale:
+                for festo in festos:
+                    for detail in festo.schedule_details:
+                        changes = detail.changes()
+                        if changes:
+                            detail_changes.append(changes)
+
+            pressure_changes = []
+            new_current_details = []
+            for festo in festos:
+                if festo.pressure is None:
+                    continue
+                if festo.current_detail_id is None:
+                    new_current_details.append((festo, FestoCurrentDetail(
+                        slave_id=festo.slave_id,
+                        pressure=festo.pressure,
+                        festo_main_id=festo.id,
+                    )))
+                else:
+                    pressure_changes.append(
+                        {"id": festo.current_detail_id, "pressure": festo.pressure})
+                festo.pressure = None
+
+            if detail_changes:
+                session.execute(update(ScheduleDetail), detail_changes)
+            if pressure_changes:
+                session.execute(update(FestoCurrentDetail), pressure_changes)
+            if new_current_details:
+                session.add_all([detail for _, detail in new_current_details])
+                session.flush()
+                for festo, detail in new_current_details:
+                    festo.current_detail_id = detail.id
+
+            for festo in festos:
+                for detail in festo.schedule_details:
+                    detail.mark_persisted()
+
+            return len(detail_changes), len(pressure_changes) + len(new_current_details)
+
+
+schedule_cache = ScheduleCache()
@@ -0,0 +1,105 @@
+import numpy as np
+
+
+def _to_us(values):
+    return np.array(values, dtype="datetime64[us]").astype(np.int64)
+
+
+class ScheduleTimeline:
+    def __init__(self, schedules):
+        """
+        所有設備排程步驟的編譯時間軸
+
+        在排程被修改而重新載入時建立一次，之後每個 tick 以一次
+        searchsorted 找出所有設備目前執行中與最接近的步驟。
+        各設備的步驟依開始時間排序後串接成一個陣列，
+        以 (設備序號, 時間) 組成遞增的鍵，每台設備的查詢都是 O(log n)。
+        同一設備的步驟依序排列不重疊，缺少時間的步驟不列入。
+
+        Args:
+            schedules: 每台設備的排程步驟列表，查詢結果的順序與此相同
+        """
+        self.details = []
+        offsets = [0]
+        for schedule_details in schedules:
+            self.details.extend(sorted(
+                (detail for detail in schedule_details if detail.time_start and detail.time_end),
+                key=lambda x: x.time_start))
+            offsets.append(len(self.details))
+
+        self.offsets = np.array(offsets, dtype=np.int64)
+        self.counts = np.diff(self.offsets)
+        self.starts = _to_us([detail.time_start for detail in self.details])
+        self.ends = _to_us([detail.time_end for detail in self.details])
+        # 已標記為結束的步驟數，避免每個 tick 重複走訪
+        self._marked = np.zeros(len(schedules), dtype=np.int64)
+
+        if self.details:
+            self._low = int(min(self.starts.min(), self.ends.min())) - 1
+            self._high = int(max(self.starts.max(), self.ends.max())) + 1
+        else:
+            self._low = self._high = 0
+        self._span = self._high - self._low + 1
+        owners = np.repeat(np.arange(len(schedules), dtype=np.int64), self.counts) * self._span
+        self._start_keys = owners + (self.starts - self._low)
+        # 結束時間取累計最大值，步驟重疊時仍保持遞增
+        self._end_keys = np.maximum.accumulate(owners + (self.ends - self._low))
+
+    def __len__(self):
+        return len(self.counts)
+
+    def lookup(self, current_time):
+        """
+        一次查詢所有設備在 current_time 的步驟
+
+        Returns:
+            (active, nearest, ended)
+            active: 執行中步驟在 details 的索引，沒有時為 -1
+            nearest: 執行中的步驟，沒有時為時間上最接近的步驟 (相同距離取較早的)，沒有步驟時為 -1
+            ended: 已結束 (time_end < current_time) 的步驟數
+        """
+        if not self.details:
+            missing = np.full(len(self), -1, dtype=np.int64)
+            return missing, missing.copy(), np.zeros(len(self), dtype=np.int64)
+
+        now = int(_to_us(current_time))
+        first = self.offsets[:-1]
+        keys = np.arange(len(self), dtype=np.int64) * self._span \
+            + (min(max(now, self._low), self._high) - self._low)
+
+        started = np.searchsorted(self._start_keys, keys, side="right") - first
+        ended = np.searchsorted(self._end_keys, keys, side="left") - first
+
+        # 最後一個已開始的步驟尚未結束就是執行中，否則與下一個步驟比較距離
+        last = first + started - 1
+        upcoming = first + started
+        has_last = started > 0
+        has_next = started < self.counts
+        last_end = self.ends[np.clip(last, 0, len(self.details) - 1)]
+        next_start = self.starts[np.clip(upcoming, 0, len(self.details) - 1)]
+
+        active = np.where(has_last & (last_end >= now), last, -1)
+        unreachable = np.iinfo(np.int64).max
+        before = np.where(has_last, now - last_end, unreachable)
+        after = np.where(has_next, next_start - now, unreachable)
+        nearest = np.where(before <= after, last, upcoming)
+        nearest = np.where(has_last | has_next, nearest, -1)
+        nearest = np.where(active >= 0, active, nearest)
+        return active, nearest, ended
+
+    def detail(self, index):
+        """lookup 返回的索引對應的步驟，-1 時返回 None"""
+        return self.details[index] if index >= 0 else None
+
+    def schedule(self, slot):
+        """第 slot 台設備依時間排序的步驟"""
+        return self.details[self.offsets[slot]:self.offsets[slot + 1]]
+
+    def newly_ended(self, slot, ended):
+        """返回上次呼叫後才結束的步驟"""
+        marked = int(self._marked[slot])
+        if ended <= marked:
+            return []
+        self._marked[slot] = ended
+        start = int(self.offsets[slot])
+        return self.details[start + marked:start + ended]
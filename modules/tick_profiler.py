@@ -0,0 +1,131 @@
+import math
+import threading
+import time
+from collections import deque
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class RollingHistogram:
+    def __init__(self, window=720):
+        """
+        最近 window 筆樣本的延遲分佈，另外累計全部的筆數與總和
+
+        Args:
+            window: 計算百分位數時保留的樣本數 (預設 720 筆，每 5 秒一次約一小時)
+        """
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        with self._lock:
+            self._samples.append(value)
+            self.count += 1
+            self.total += value
+
+    def quantiles(self, quantiles=QUANTILES):
+        """返回 {quantile: 秒數}，沒有樣本時返回空 dict"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return {}
+        return {q: samples[max(0, math.ceil(q * len(samples)) - 1)] for q in quantiles}
+
+
+class Tick:
+    """單次 tick 的計時，lap() 記錄從上一次 lap 到現在屬於哪個階段"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.phases = {}
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - self._last
+        self._last = now
+
+
+class TickProfiler:
+    def __init__(self, interval=5, window=720):
+        """
+        排程 tick 的效能統計
+
+        記錄每個 tick 與各階段 (Modbus 讀寫、資料庫、推送...) 的耗時、
+        每個 slave 每次讀寫的耗時，以及超過排程間隔與被跳過的 tick 數，
+        由 /metrics 以 Prometheus 格式輸出。
+
+        Args:
+            interval: 排程間隔秒數，tick 耗時超過時計為 overrun
+            window: 每個分佈保留的樣本數
+        """
+        self.interval = interval
+        self.window = window
+        self.tick_duration = RollingHistogram(window)
+        self.tick_lateness = RollingHistogram(window)
+        self.phase_durations = {}
+        self.slave_durations = {}
+        self.counters = {"ticks": 0, "overruns": 0, "missed": 0, "errors": 0}
+        self.stats_sources = {}
+        self._lock = threading.Lock()
+
+    def configure(self, interval=None, window=None):
+        if interval is not None:
+            self.interval = interval
+        if window is not None:
+            self.window = window
+            self.tick_duration = RollingHistogram(window)
+            self.tick_lateness = RollingHistogram(window)
+
+    def register_stats(self, name, fn, label=None):
+        """
+        登記在 /metrics 輸出的統計來源
+
+        Args:
+            name: 指標名稱的前綴
+            fn: 返回 get_stats() 格式 dict 的函式
+            label: fn 返回 {label 值: stats} 時的 label 名稱
+        """
+        self.stats_sources[name] = (fn, label)
+
+    def _histogram(self, histograms, key):
+        histogram = histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = histograms.setdefault(key, RollingHistogram(self.window))
+        return histogram
+
+    def start(self):
+        return Tick()
+
+    def finish(self, tick, failed=False):
+        """tick 結束時呼叫，記錄總耗時與各階段耗時"""
+        elapsed = time.perf_counter() - tick.started
+        self.tick_duration.observe(elapsed)
+        for phase, seconds in tick.phases.items():
+            self._histogram(self.phase_durations, phase).observe(seconds)
+        with self._lock:
+            self.counters["ticks"] += 1
+            if elapsed > self.interval:
+                self.counters["overruns"] += 1
+            if failed:
+                self.counters["errors"] += 1
+        return elapsed
+
+    def observe_slave(self, gateway, slave_id, op, seconds):
+        """記錄單一 slave 一次讀 (read) 或寫 (write) 的耗時"""
+        self._histogram(self.slave_durations, (gateway, slave_id, op)).observe(seconds)
+
+    def late(self, seconds):
+        """記錄 tick 實際開始時間比預定時間晚了幾秒"""
+        self.tick_lateness.observe(seconds)
+
+    def missed(self, count=1):
+        """排程來不及執行而被跳過的 tick"""
+        with self._lock:
+            self.counters["missed"] += count
+
+
+tick_profiler = TickProfiler()
@@ -0,0 +1,45 @@
+import threading
+import time
+
+
+class TTLCache:
+    def __init__(self, ttl=30, max_entries=256):
+        """
+        簡單的記憶體 TTL 快取
+
+        Args:
+            ttl: 每筆資料的有效秒數 (0 代表停用快取)
+            max_entries: 最多保留的筆數，超過時先清除最舊的資料
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, key, loader, ttl=None):
+        """
+        返回 key 的快取值，不存在或已過期時呼叫 loader() 重新載入，
+        ttl 可覆寫這筆資料的有效秒數
+        """
+        ttl = self.ttl if ttl is None else ttl
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.stats["hits"] += 1
+                return entry[1]
+            self.stats["misses"] += 1
+
+        value = loader()
+        if ttl > 0:
+            with self._lock:
+                if len(self._entries) >= self.max_entries:
+                    oldest = min(self._entries, key=lambda k: self._entries[k][0])
+                    del self._entries[oldest]
+                self._entries[key] = (now + ttl, value)
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
@@ -1,5 +1,5 @@
 from flask_restx import Namespace, Resource, fields, marshal_with
-from controller.festo import create, read, read_multi, update, delete, get_currently_executing_info
+from controller.festo import create, read, read_multi, update, delete, get_currently_executing_info, stream_executing
 
 festo_ns = Namespace('festo', description='Festo operations')
 
@@ -36,6 +36,8 @@ festo_response = festo_ns.model('FestoResponse', {
         'id': fields.Integer(description='Festo ID'),
         'name': fields.String(description='Festo name'),
         'slave_id': fields.Integer(description='Slave ID'),
+        'gatewayHost': fields.String(description='Gateway host'),
+        'gatewayPort': fields.Integer(description='Gateway port'),
         'batch_number': fields.String(description='Batch number'),
         'warning_time': fields.Integer(description='Warning time')
     }))
@@ -51,6 +53,8 @@ executing_response = festo_ns.model('ExecutingResponse', {
 festo_input = festo_ns.model('FestoInput', {
     'name': fields.String(required=True, description='Festo name'),
     'slaveId': fields.Integer(description='Slave ID'),
+    'gatewayHost': fields.String(description='Gateway host, defaults to FESTO_HOST'),
+    'gatewayPort': fields.Integer(description='Gateway port, defaults to FESTO_PORT'),
     'batchNumber': fields.String(description='Batch number'),
     'warningTime': fields.Integer(description='Warning time')
 })
@@ -58,6 +62,8 @@ festo_input = festo_ns.model('FestoInput', {
 festo_update = festo_ns.model('FestoUpdate', {
     'name': fields.String(description='Festo name'),
     'slaveId': fields.Integer(description='Slave ID'),
+    'gatewayHost': fields.String(description='Gateway host, defaults to FESTO_HOST'),
+    'gatewayPort': fields.Integer(description='Gateway port, defaults to FESTO_PORT'),
     'batchNumber': fields.String(description='Batch number'),
     'warningTime': fields.Integer(description='Warning time')
 })
@@ -81,8 +87,7 @@ class FestoList(Resource):
                       500: ('Database error', error_response)
                   })
     def get(self):
-        result, status = read_multi()
-        return result, status
+        return read_multi()
 
 @festo_ns.route('/<int:festo_id>')
 class Festo(Resource):
@@ -123,8 +128,20 @@ class FestoExecuting(Resource):
     @festo_ns.doc('get_executing_festo',
                   responses={
                       200: ('Success', executing_response),
+                      304: 'Not modified since the ETag sent in If-None-Match',
                       500: ('Database error', error_response)
                   })
     def get(self):
-        result, status = get_currently_executing_info()
-        return result, status
+        return get_currently_executing_info()
+
+@festo_ns.route('/stream')
+class FestoStream(Resource):
+    @festo_ns.doc('stream_festo',
+                  description='Server-sent events, one "tick" event per scheduler run with every '
+                              'festo pressure and its current schedule step',
+                  responses={
+                      503: ('Too many stream clients', error_response)
+                  })
+    @festo_ns.produces(['text/event-stream'])
+    def get(self):
+        return stream_executing()
@@ -1,5 +1,6 @@
 from flask_restx import Namespace, Resource, fields, marshal_with
-from controller.history import get_unique_batch_numbers, get_batch_records_csv, get_festo_history
+from controller.history import get_unique_batch_numbers, get_batch_records_export, get_festo_history, \
+    submit_history_job, get_history_job, get_history_job_result, cancel_history_job
 
 history_ns = Namespace('history', description='History operations')
 
@@ -31,13 +32,33 @@ history_input = history_ns.model('HistoryInput', {
     'batchNumber': fields.String(required=True, description='Batch number'),
     'startTime': fields.String(required=True, description='Start time'),
     'endTime': fields.String(required=True, description='End time'),
-    'type': fields.String(required=True, description='Time type (hour/minute)')
+    'type': fields.String(required=True, description='Time type (hour/minute)'),
+    'maxPoints': fields.Integer(required=False, description='Downsample the response to at most this many points'),
+    'downsample': fields.String(required=False, description='Downsampling method (lttb/minmax), default lttb')
 })
 
 export_input = history_ns.model('ExportInput', {
     'startTime': fields.String(required=True, description='Start time'),
     'endTime': fields.String(required=True, description='End time'),
-    'batchNumber': fields.String(required=True, description='Batch number')
+    'batchNumber': fields.String(required=True, description='Batch number'),
+    'format': fields.String(required=False, description='Export format (csv/arrow/parquet), default csv')
+})
+
+job_input = history_ns.model('HistoryJobInput', {
+    'kind': fields.String(required=True, description='Job kind (history/export)'),
+    'batchNumber': fields.String(required=True, description='Batch number'),
+    'startTime': fields.String(required=True, description='Start time'),
+    'endTime': fields.String(required=True, description='End time'),
+    'type': fields.String(required=False, description='Time type (hour/minute), history jobs'),
+    'maxPoints': fields.Integer(required=False, description='Downsample to at most this many points, history jobs'),
+    'downsample': fields.String(required=False, description='Downsampling method (lttb/minmax), history jobs'),
+    'format': fields.String(required=False, description='Export format (csv/arrow/parquet), export jobs')
+})
+
+job_response = history_ns.model('HistoryJobResponse', {
+    'code': fields.Integer(description='Response code'),
+    'msg': fields.String(description='Response message'),
+    'data': fields.Raw(description='Job id, kind, status, progress and timestamps')
 })
 
 @history_ns.route('')
@@ -45,6 +66,7 @@ class HistoryList(Resource):
     @history_ns.doc('get_history',
                     responses={
                         200: ('Success', history_response),
+                        400: ('Invalid maxPoints or downsample method', error_response),
                         500: ('Database error', error_response)
                     })
     @history_ns.expect(history_input)
@@ -67,12 +89,60 @@ class HistoryBatch(Resource):
 @history_ns.route('/export')
 class HistoryExport(Resource):
     @history_ns.doc('export_csv',
-                    description='Export batch records as CSV file',
+                    description='Export batch records as a CSV, Arrow IPC stream or Parquet file',
                     responses={
+                        400: ('Unknown export format', error_response),
                         500: ('Database error', error_response)
                     })
     @history_ns.expect(export_input)
-    @history_ns.produces(['text/csv'])
+    @history_ns.produces(['text/csv', 'application/vnd.apache.arrow.stream', 'application/vnd.apache.parquet'])
     def post(self):
         data = history_ns.payload
-        return get_batch_records_csv(data)
+        return get_batch_records_export(data)
+
+@history_ns.route('/jobs')
+class HistoryJobList(Resource):
+    @history_ns.doc('submit_history_job',
+                    description='Run a history query or export in the background',
+                    responses={
+                        202: ('Job accepted', job_response),
+                        400: ('Unknown job kind or parameter', error_response),
+                        429: ('Too many jobs', error_response)
+                    })
+    @history_ns.expect(job_input)
+    def post(self):
+        data = history_ns.payload
+        result, status = submit_history_job(data)
+        return result, status
+
+@history_ns.route('/jobs/<string:job_id>')
+class HistoryJob(Resource):
+    @history_ns.doc('get_history_job',
+                    responses={
+                        200: ('Success', job_response),
+                        404: ('Job not found', error_response)
+                    })
+    def get(self, job_id):
+        result, status = get_history_job(job_id)
+        return result, status
+
+    @history_ns.doc('cancel_history_job',
+                    description='Cancel a queued or running job, or delete a finished one',
+                    responses={
+                        200: ('Job cancelled', job_response),
+                        404: ('Job not found', error_response)
+                    })
+    def delete(self, job_id):
+        result, status = cancel_history_job(job_id)
+        return result, status
+
+@history_ns.route('/jobs/<string:job_id>/result')
+class HistoryJobResult(Resource):
+    @history_ns.doc('get_history_job_result',
+                    description='History jobs return JSON, export jobs return the exported file',
+                    responses={
+                        404: ('Job not found', error_response),
+                        409: ('Job not finished', error_response)
+                    })
+    def get(self, job_id):
+        return get_history_job_result(job_id)
@@ -0,0 +1,15 @@
+from flask_restx import Namespace, Resource
+from controller.metrics import get_metrics
+
+metrics_ns = Namespace('metrics', description='Prometheus metrics')
+
+
+@metrics_ns.route('')
+class Metrics(Resource):
+    @metrics_ns.doc('get_metrics',
+                    description='Scheduler tick, per-phase and per-slave latency summaries (p50/p95/p99), '
+                                'overrun and missed tick counters, Modbus driver, history writer, '
+                                'background job and stream statistics in Prometheus text format')
+    @metrics_ns.produces(['text/plain'])
+    def get(self):
+        return get_metrics()
@@ -3,6 +3,7 @@ from routers.formula import formula_ns
 from routers.user import user_ns
 from routers.festo import festo_ns
 from routers.history import history_ns
+from routers.metrics import metrics_ns
 
 
 class routes:
@@ -12,3 +13,4 @@ class routes:
         api.add_namespace(user_ns, path='/user')
         api.add_namespace(festo_ns, path='/festo')
         api.add_namespace(history_ns, path='/history')
+        api.add_namespace(metrics_ns, path='/metrics')
@@ -0,0 +1,118 @@
+import threading
+import time
+from modules.tick_profiler import tick_profiler
+
+
+class ControlLoop:
+    def __init__(self, interval=5, degrade=True, degrade_threshold=0.8,
+                 degrade_after=2, recover_after=12):
+        """
+        排程控制迴圈
+
+        以單一執行緒依序執行所有 task，同一時間最多只有一個 tick 在執行。
+        tick 以 monotonic 時間排在固定的格點上 (start + n * interval)，
+        執行時間不會累積成漂移；tick 超時錯過的格點合併成一次立即執行，
+        並記錄為 missed。
+
+        過載時 (tick 耗時連續 degrade_after 次超過 interval * degrade_threshold)
+        進入降級模式，perform_schedule 只輪詢有執行中步驟的設備，
+        連續 recover_after 次低於門檻後恢復。
+
+        Args:
+            interval: tick 間隔秒數
+            degrade: 是否允許進入降級模式
+            degrade_threshold: 過載門檻，tick 耗時佔 interval 的比例
+            degrade_after: 連續過載幾次後進入降級模式
+            recover_after: 連續正常幾次後恢復
+        """
+        self.interval = interval
+        self.degrade = degrade
+        self.degrade_threshold = degrade_threshold
+        self.degrade_after = degrade_after
+        self.recover_after = recover_after
+        self.degraded = False
+        self.tasks = []
+        self.stats = {"ticks": 0, "missed": 0, "degraded_ticks": 0, "task_failures": 0}
+        self._overloaded = 0
+        self._healthy = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def configure(self, interval=None, degrade=None, degrade_threshold=None,
+                  degrade_after=None, recover_after=None):
+        if interval is not None:
+            self.interval = interval
+        if degrade is not None:
+            self.degrade = degrade
+        if degrade_threshold is not None:
+            self.degrade_threshold = degrade_threshold
+        if degrade_after is not None:
+            self.degrade_after = degrade_after
+        if recover_after is not None:
+            self.recover_after = recover_after
+
+    def task(self, fn):
+        """登記每個 tick 依序執行的函式，可當作 decorator 使用"""
+        self.tasks.append(fn)
+        return fn
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="control-loop", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        scheduled = time.monotonic()
+        while not self._stop.wait(max(0.0, scheduled - time.monotonic())):
+            started = time.monotonic()
+            tick_profiler.late(started - scheduled)
+            self.run_once()
+            finished = time.monotonic()
+
+            scheduled += self.interval
+            if finished > scheduled:
+                # 錯過的格點合併成一次，下一個 tick 立即執行
+                missed = int((finished - scheduled) // self.interval)
+                scheduled += missed * self.interval
+                self.stats["missed"] += missed
+                tick_profiler.missed(missed)
+            self._update_degraded(finished - started)
+
+    def run_once(self):
+        """執行一次所有 task，單一 task 失敗不影響其他 task"""
+        self.stats["ticks"] += 1
+        if self.degraded:
+            self.stats["degraded_ticks"] += 1
+        for fn in self.tasks:
+            try:
+                fn()
+            except Exception as e:
+                self.stats["task_failures"] += 1
+                print(f"Control loop task {fn.__name__} failed: {e}")
+
+    def _update_degraded(self, elapsed):
+        if elapsed > self.interval * self.degrade_threshold:
+            self._overloaded += 1
+            self._healthy = 0
+        else:
+            self._healthy += 1
+            self._overloaded = 0
+
+        if not self.degraded and self.degrade and self._overloaded >= self.degrade_after:
+            self.degraded = True
+            print(f"Control loop degraded: tick took {elapsed:.2f}s of {self.interval}s")
+        elif self.degraded and self._healthy >= self.recover_after:
+            self.degraded = False
+            print("Control loop recovered")
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["degraded"] = self.degraded
+        return stats
@@ -1,15 +1,32 @@
 from flask_apscheduler import APScheduler
 from flask import current_app
-from models.festo import FestoMain, FestoHistory, FestoCurrentDetail
+from models.festo import FestoHistory, FestoHistoryMinute, FestoHistoryHour, FestoBatchCatalog
 from models.schedule import ScheduleDetail
 from sqlalchemy.exc import SQLAlchemyError
 from models.shared import db
 from modules.festo import festo as festo_obj
+from modules.festo_async import festo_poller
+from modules.festo_pool import festo_pool
+from modules.schedule_cache import schedule_cache, load_tick_festos
+from modules.history_writer import history_writer
+from modules.broadcaster import festo_broadcaster
+from modules.executing_snapshot import executing_snapshot, build_executing_info
+from modules.tick_profiler import tick_profiler
+from scheduler.control_loop import ControlLoop
+from modules.history_retention import purge_history
+from modules.history_archive import archive_history
+from modules.history_partition import drop_expired_partitions, ensure_future_partitions, is_partitioned
 from datetime import datetime, timedelta
 import pygame
+import atexit
+import time
 import os
 
 scheduler = APScheduler()
+# perform_schedule 與 schedule_check_play_mp3 由控制迴圈執行，其餘排程交給 APScheduler
+control_loop = ControlLoop()
+# 排程已全部結束、停止 (壓力 0) 已確認寫入成功的設備 id，降級模式下不再重送
+stopped_festos = set()
 # 初始化 pygame
 pygame.init()
 
@@ -17,129 +34,275 @@ mp3_file_path = "asset/beep-warning.mp3"
 festo_obj_conn = None
 
 
-@scheduler.task("interval", id="schedule", seconds=5)  # 每3600秒执行一次
+def build_tick_payload(festos, timeline, current_time):
+    """
+    每個 tick 推送給 /festo/stream 的資料: 各設備壓力與目前的排程步驟，
+    排程欄位與 /festo/executing 相同
+    """
+    _, nearest, _ = timeline.lookup(current_time)
+    devices = []
+    for festo, index in zip(festos, nearest):
+        detail = timeline.detail(index)
+        devices.append({
+            "id": festo.id,
+            "festoName": festo.name,
+            "slaveId": festo.slave_id,
+            "batchNumber": festo.batch_number,
+            "pressure": festo.pressure,
+            "warningTime": (festo.warning_time or 0) * 5 / 60,
+            "formulaName": festo.formula_name,
+            "schedulePressure": detail.pressure if detail else None,
+            "scheduleSequence": detail.sequence if detail else None,
+            "scheduleStatus": detail.status if detail else None,
+            "checkPressure": detail.check_pressure if detail else None,
+            "resetTimes": detail.reset_times if detail else None,
+        })
+    return {"time": current_time.strftime('%Y-%m-%d %H:%M:%S'), "data": devices}
+
+
+@control_loop.task
 def perform_schedule():
     with scheduler.app.app_context():
         festo_deviation = current_app.config["FESTO_DEVIATION"]
         current_time = datetime.now()
+        # 各階段耗時由 /metrics 輸出
+        tick = tick_profiler.start()
+        failed = False
 
         try:
-            festos = FestoMain.query.all()
-
-            for festo in festos:
+            # 排程資料只在被修改後才重新載入，其餘 tick 完全在記憶體中判斷
+            festos, timeline, loaded_version = schedule_cache.get(load_tick_festos)
+            # 所有設備的執行中步驟與已結束步驟數以一次查詢取得
+            active, _, ended = timeline.lookup(current_time)
+            tick.lap("schedule_load")
+
+            # 先平行讀取所有閘道上的 slave，排程只需要 Input Registers
+            gateway_keys = {
+                festo.id: festo_obj_conn.gateway_key(festo.gateway_host, festo.gateway_port)
+                for festo in festos
+            }
+            # 過載降級時只輪詢有執行中步驟的設備
+            polled = [festo for slot, festo in enumerate(festos)
+                      if not control_loop.degraded or active[slot] >= 0]
+            snapshots = festo_obj_conn.read_snapshots(
+                [(gateway_keys[festo.id], festo.slave_id) for festo in polled], holding=False)
+            tick.lap("modbus_read")
+            # 壓力寫入在狀態判斷完後一次送出
+            pending_writes = []
+            # 停止寫入在 pending_writes 中的位置與設備 id
+            stop_writes = []
+
+            for slot, festo in enumerate(festos):
                 slave_id = festo.slave_id
-                festo_pressure = festo_obj_conn.readVacuumPressure(slave_id)
-                if festo_pressure is None:
-                    e = f"Can't read {festo.name} pressure"
-                    print(e)
-                    current_app.logger.error(e)
+                gateway_key = gateway_keys[festo.id]
+                if (gateway_key, slave_id) not in snapshots:
+                    # 降級模式下沒有輪詢，只處理步驟結束
+                    festo_pressure = None
+                else:
+                    snapshot = snapshots[(gateway_key, slave_id)]
+                    if snapshot is None:
+                        e = f"Can't read {festo.name} pressure"
+                        print(e)
+                        current_app.logger.error(e)
+                        continue
+                    festo_pressure = snapshot.vacuum_pressure
+                    festo.pressure = festo_pressure
+
+                if festo.schedule_id is None:
                     continue
 
-                schedule_details = (
-                    ScheduleDetail.query.filter_by(schedule_id=festo.schedule.id)
-                    .order_by(ScheduleDetail.sequence)
-                    .all()
-                )
+                # 已結束的步驟標記為結束狀態
+                newly_ended = timeline.newly_ended(slot, ended[slot])
+                for detail in newly_ended:
+                    detail.status = 2
+
+                detail = timeline.detail(active[slot])
+                if detail is not None:
+                    status = detail.status
+                    dst_pressure = detail.pressure
+
+                    if status == 0:
+                        # 待執行狀態
+                        print(
+                            f"To be executed Festo Slave ID: {slave_id}, Pressure: {dst_pressure}, Status: {status}"
+                        )
+                        pending_writes.append((gateway_key, slave_id, dst_pressure))
+                        detail.status = 1
+                    elif status == 1:
+                        # 執行中狀態
+                        print(
+                            f"Executing Festo Slave ID: {slave_id}, Pressure: {dst_pressure}, Status: {status}"
+                        )
+                        history_writer.add(
+                            slave_id=slave_id,
+                            batch_number=festo.batch_number,
+                            formula_name=festo.formula_name,
+                            sequence=detail.sequence,
+                            pressure=festo_pressure,
+                            create_time=current_time,
+                        )
+                        # 正負誤差超過 3 就累積錯誤
+                        if not (
+                            dst_pressure + festo_deviation
+                            > festo_pressure
+                            > dst_pressure - festo_deviation
+                        ):
+                            # 真空閥可能被關閉，所以要再打開
+                            pending_writes.append((gateway_key, slave_id, dst_pressure))
+                            detail.reset_times += 1
+                            # 延長 schedule time
+                            # __update_schedule_start_time_and_end_time(
+                            #     detail.id)
+                            current_app.logger.warning(
+                                f"Pressure not reach Festo Slave ID: {slave_id}, Pressure: {festo_pressure}, Dst Pressure: {dst_pressure}, Status: {status}"
+                            )
+                        else:
+                            print(f"Festo Slave ID: {slave_id} close valve port")
+                            # 到達目標壓力關閉真空閥
+                            pending_writes.append((gateway_key, slave_id, 20000))
+                    elif status == 2:
+                        # 結束狀態
+                        detail.status = 2
+                        print(
+                            f"End Festo Slave ID: {slave_id}, Pressure: {dst_pressure}, Status: {status}"
+                        )
+
+                elif ended[slot] and ended[slot] == timeline.counts[slot]:
+                    # 最後一個排成結束了；每個 tick 重送，降級模式下只重送尚未確認成功的
+                    if not control_loop.degraded or festo.id not in stopped_festos:
+                        stop_writes.append((len(pending_writes), festo.id))
+                        pending_writes.append((gateway_key, slave_id, 0))
+                        print(f"stop {festo.name}")
+                    continue
 
-                festo_current_detail = FestoCurrentDetail.query.filter_by(
-                    slave_id=slave_id
-                ).first()
-
-                if festo_current_detail is None:
-                    festo_current_detail = FestoCurrentDetail(
-                        slave_id=slave_id,
-                        pressure=festo_pressure,
-                        festo_main_id=festo.id,
-                    )
-                    db.session.add(festo_current_detail)
-                else:
-                    festo_current_detail.pressure = festo_pressure
+                stopped_festos.discard(festo.id)
 
-                for index, detail in enumerate(schedule_details):
-                    if detail.time_start <= current_time <= detail.time_end:
-                        status = detail.status
-                        dst_pressure = detail.pressure
+            tick.lap("evaluate")
 
-                        if status == 0:
-                            # 待執行狀態
-                            print(
-                                f"To be executed Festo Slave ID: {slave_id}, Pressure: {dst_pressure}, Status: {status}"
-                            )
-                            festo_obj_conn.writePressure(slave_id, dst_pressure)
-                            detail.status = 1
-                        elif status == 1:
-                            # 執行中狀態
-                            print(
-                                f"Executing Festo Slave ID: {slave_id}, Pressure: {dst_pressure}, Status: {status}"
-                            )
-                            festo_history = FestoHistory(
-                                slave_id=slave_id,
-                                batch_number=festo.batch_number,
-                                formula_name=festo.formula.name,
-                                sequence=detail.sequence,
-                                pressure=festo_pressure,
-                            )
-                            db.session.add(festo_history)
-                            # 正負誤差超過 3 就累積錯誤
-                            if not (
-                                dst_pressure + festo_deviation
-                                > festo_pressure
-                                > dst_pressure - festo_deviation
-                            ):
-                                # 真空閥可能被關閉，所以要再打開
-                                festo_obj_conn.writePressure(slave_id, dst_pressure)
-                                detail.reset_times += 1
-                                # 延長 schedule time
-                                # __update_schedule_start_time_and_end_time(
-                                #     detail.id)
-                                current_app.logger.warning(
-                                    f"Pressure not reach Festo Slave ID: {slave_id}, Pressure: {festo_pressure}, Dst Pressure: {dst_pressure}, Status: {status}"
-                                )
-                            else:
-                                print(f"Festo Slave ID: {slave_id} close valve port")
-                                # 到達目標壓力關閉真空閥
-                                festo_obj_conn.writePressure(slave_id, 20000)
-                        elif status == 2:
-                            # 結束狀態
-                            detail.status = 2
-                            print(
-                                f"End Festo Slave ID: {slave_id}, Pressure: {dst_pressure}, Status: {status}"
-                            )
+            if pending_writes:
+                written = festo_obj_conn.write_pressures(pending_writes)
+                # 寫入失敗的停止在下一個 tick 重送
+                for index, festo_id in stop_writes:
+                    if written[index]:
+                        stopped_festos.add(festo_id)
+                    else:
+                        stopped_festos.discard(festo_id)
+            tick.lap("modbus_write")
 
-                        # 有抓到schedule就結束
-                        break
-
-                    elif current_time > detail.time_end:
-                        detail.status = 2
-                        # 最後一個排成結束了
-                        if (index == len(schedule_details) - 1) and detail.status == 2:
-                            festo_obj_conn.writePressure(slave_id, 0)
-                            print(f"stop {festo.name}")
+            # flush 會清除本次讀到的壓力，推送的資料要在 flush 之前建立
+            payload = build_tick_payload(festos, timeline, current_time)
+            tick.lap("publish")
 
+            # status/reset_times 與目前壓力批次寫回，整個 tick 只 commit 一次
+            schedule_cache.flush(db.session, festos, loaded_version)
+            tick.lap("db_flush")
             db.session.commit()
+            tick.lap("db_commit")
+
+            # 推送給所有 /festo/stream 連線，並更新 /festo/executing 的快照
+            festo_broadcaster.publish("tick", payload)
+            executing_snapshot.publish(
+                build_executing_info(festos, timeline, current_time), loaded_version)
+            tick.lap("publish")
         except SQLAlchemyError as e:
+            failed = True
+            schedule_cache.invalidate()
             current_app.logger.error(e)
         except Exception as e:
+            failed = True
+            schedule_cache.invalidate()
             current_app.logger.error(e)
         finally:
             db.session.close()
 
+        # 歷史資料累積到一定數量或時間才批次寫入；
+        # 寫入失敗時資料留在緩衝區下次再寫，與排程快取無關，只記錄錯誤
+        try:
+            if history_writer.should_flush():
+                history_writer.flush(db.engine)
+        except Exception as e:
+            current_app.logger.error(e)
+        finally:
+            tick.lap("history_flush")
+            tick_profiler.finish(tick, failed)
+
+
+def history_partition_maintenance(mode, cutoff):
+    """
+    分區模式的保留政策: 預先建立未來的分區，並整個刪除已過期的分區
+    """
+    started = time.monotonic()
+    with db.engine.begin() as conn:
+        created = ensure_future_partitions(
+            conn, mode, current_app.config["HISTORY_PARTITION_AHEAD"])
+    with db.engine.begin() as conn:
+        dropped = drop_expired_partitions(conn, cutoff)
+    current_app.logger.info(
+        f"History partitions: created {created}, dropped {dropped}, "
+        f"{time.monotonic() - started:.2f}s"
+    )
+
 
 @scheduler.task("interval", id="history_checker", seconds=86400)
 def history_checker():
     with scheduler.app.app_context():
         print("clear history table")
         try:
-            thirty_days_ago = datetime.now() - timedelta(days=int(os.getenv('HISTORY_RETENTION_DAYS', 30)))
-
-            records_to_delete = FestoHistory.query.filter(
-                FestoHistory.create_time <= thirty_days_ago
-            ).all()
-
-            for record in records_to_delete:
-                db.session.delete(record)
+            retention_days = current_app.config["HISTORY_RETENTION_DAYS"]
+            thirty_days_ago = datetime.now() - timedelta(days=retention_days)
+
+            partition_mode = current_app.config["HISTORY_PARTITION_MODE"]
+            partitioned = False
+            if partition_mode:
+                with db.engine.begin() as conn:
+                    partitioned = is_partitioned(conn)
+
+            # 刪除前先將過期資料依批次封存成 Parquet 檔
+            archive_dir = current_app.config["HISTORY_ARCHIVE_DIR"]
+            if archive_dir:
+                archived, files, elapsed = archive_history(
+                    db.engine,
+                    thirty_days_ago,
+                    archive_dir,
+                    chunk_size=current_app.config["HISTORY_ARCHIVE_CHUNK_SIZE"],
+                    sleep=current_app.config["HISTORY_DELETE_CHUNK_SLEEP"],
+                )
+                current_app.logger.info(
+                    f"History archive moved {archived} rows older than {retention_days} days "
+                    f"to {files} files in {archive_dir}, {elapsed:.2f}s"
+                )
 
-            db.session.commit()
+            targets = []
+            if partitioned:
+                history_partition_maintenance(partition_mode, thirty_days_ago)
+            else:
+                targets.append((FestoHistory.create_time, retention_days))
+            # 彙總表資料量小，保留天數可以比原始資料長
+            rollup_days = current_app.config["HISTORY_ROLLUP_RETENTION_DAYS"]
+            targets.append((FestoHistoryMinute.bucket_time, rollup_days))
+            targets.append((FestoHistoryHour.bucket_time, rollup_days))
+            # 批次目錄保留到該批次的原始資料與彙總表都過期為止；
+            # 啟用封存時封存檔不會刪除，批次仍可從封存檔查詢，目錄也不刪除
+            if not archive_dir:
+                if current_app.config["HISTORY_ROLLUP_ENABLED"]:
+                    catalog_days = max(retention_days, rollup_days)
+                else:
+                    catalog_days = retention_days
+                targets.append((FestoBatchCatalog.last_time, catalog_days))
+
+            # 分批刪除，每批獨立交易，避免一次鎖住整個資料表
+            for time_column, days in targets:
+                deleted, chunks, elapsed = purge_history(
+                    db.engine,
+                    datetime.now() - timedelta(days=days),
+                    chunk_size=current_app.config["HISTORY_DELETE_CHUNK_SIZE"],
+                    sleep=current_app.config["HISTORY_DELETE_CHUNK_SLEEP"],
+                    time_column=time_column,
+                )
+                current_app.logger.info(
+                    f"{time_column.class_.__tablename__} retention removed {deleted} rows "
+                    f"older than {days} days in {chunks} chunks, {elapsed:.2f}s"
+                )
 
         except SQLAlchemyError as e:
             current_app.logger.error(e)
@@ -151,12 +314,12 @@ def history_checker():
             db.session.close()
 
 
-@scheduler.task("interval", id="schedule_check_play_mp3", seconds=5)
+@control_loop.task
 def schedule_check_play_mp3():
     with scheduler.app.app_context():
-        festos = FestoMain.query.all()
+        festos, _, _ = schedule_cache.get(load_tick_festos)
         for festo in festos:
-            schedule_details = festo.schedule.schedule_details
+            schedule_details = festo.schedule_details
             for schedule_detail in schedule_details:
                 if (
                     (schedule_detail.reset_times * 5 / 60 > festo.warning_time)
@@ -201,12 +364,79 @@ def __update_schedule_start_time_and_end_time(schedule_id):
 def init_scheduler(app):
     try:
         global festo_obj_conn
-        festo_obj_conn = festo_obj(
-            app.config["FESTO_HOST"], app.config["FESTO_PORT"]
+        festo_obj_conn = festo_pool(
+            app.config["FESTO_HOST"],
+            app.config["FESTO_PORT"],
+            lambda host, port: __create_festo_conn(app, host, port),
+            max_gateways=app.config["FESTO_MAX_GATEWAYS"],
         )
+        # 預設閘道在啟動時就建立連線
+        festo_obj_conn.get()
     except:
         print("RS485 over Ethernet connect error")
         exit()
 
+    history_writer.configure(
+        flush_size=app.config["HISTORY_FLUSH_SIZE"],
+        flush_interval=app.config["HISTORY_FLUSH_INTERVAL"],
+        max_buffer=app.config["HISTORY_BUFFER_MAX"],
+        rollup=app.config["HISTORY_ROLLUP_ENABLED"],
+    )
+    festo_broadcaster.configure(
+        max_clients=app.config["STREAM_MAX_CLIENTS"],
+        keepalive=app.config["STREAM_KEEPALIVE"],
+    )
+    executing_snapshot.configure(
+        max_age=app.config["EXECUTING_SNAPSHOT_MAX_AGE"],
+        redis_url=app.config["REDIS_URL"],
+    )
+    control_loop.configure(
+        interval=app.config["CONTROL_LOOP_INTERVAL"],
+        degrade=app.config["CONTROL_LOOP_DEGRADE"],
+        degrade_threshold=app.config["CONTROL_LOOP_DEGRADE_THRESHOLD"],
+        degrade_after=app.config["CONTROL_LOOP_DEGRADE_AFTER"],
+        recover_after=app.config["CONTROL_LOOP_RECOVER_AFTER"],
+    )
+    tick_profiler.configure(interval=app.config["CONTROL_LOOP_INTERVAL"])
+    tick_profiler.register_stats("modbus", festo_obj_conn.get_stats, label="gateway")
+    tick_profiler.register_stats("control_loop", control_loop.get_stats)
+    atexit.register(__flush_history_on_exit, app)
+    # atexit 依相反順序執行，先停止控制迴圈再寫入剩餘的歷史資料
+    atexit.register(control_loop.stop, 10)
+
     scheduler.init_app(app)
     scheduler.start()
+    control_loop.start()
+
+
+def __flush_history_on_exit(app):
+    with app.app_context():
+        try:
+            written = history_writer.flush(db.engine)
+            print(f"Flushed {written} history samples on shutdown")
+        except Exception as e:
+            print(f"History flush on shutdown failed: {e}")
+
+
+def __create_festo_conn(app, host, port):
+    if app.config["FESTO_POLL_MODE"] == "async":
+        return festo_poller(
+            host,
+            port,
+            timeout=app.config["FESTO_TIMEOUT"],
+            pipeline_depth=app.config["FESTO_PIPELINE_DEPTH"],
+            device_deadline=app.config["FESTO_DEVICE_DEADLINE"],
+            healthy_deadline=app.config["FESTO_HEALTHY_DEADLINE"],
+            batch_deadline=app.config["FESTO_BATCH_DEADLINE"],
+            backoff_base=app.config["FESTO_BACKOFF_BASE"],
+            backoff_max=app.config["FESTO_BACKOFF_MAX"],
+        )
+    return festo_obj(
+        host,
+        port,
+        timeout=app.config["FESTO_TIMEOUT"],
+        retries=app.config["FESTO_RETRIES"],
+        keepalive_interval=app.config["FESTO_KEEPALIVE_INTERVAL"],
+        backoff_base=app.config["FESTO_BACKOFF_BASE"],
+        backoff_max=app.config["FESTO_BACKOFF_MAX"],
+    )
@@ -0,0 +1,62 @@
+"""
+get_festo_history 效能測試腳本
+先執行 create_history_test_data.py 建立測試資料，再執行本腳本
+量測 1/7/30/90 天範圍的查詢次數與延遲
+"""
+from app import app
+from models.shared import db
+from controller.history import get_festo_history
+from sqlalchemy import event
+from datetime import datetime, timedelta
+import time
+
+BATCH_NUMBER = "BATCH-TEST-001"
+RANGES = [1, 7, 30, 90]
+REPEAT = 5
+
+
+def benchmark_festo_history():
+    with app.app_context():
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", count)
+        try:
+            end_time = datetime.now().replace(microsecond=0)
+            print("=" * 60)
+            print(f"get_festo_history 效能測試 (批次: {BATCH_NUMBER}, 每種範圍 {REPEAT} 次)")
+            print("=" * 60)
+
+            for time_type in ("minute", "hour"):
+                for days in RANGES:
+                    data = {
+                        "batchNumber": BATCH_NUMBER,
+                        "startTime": (end_time - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S'),
+                        "endTime": end_time.strftime('%Y-%m-%d %H:%M:%S'),
+                        "type": time_type,
+                    }
+                    latencies = []
+                    for _ in range(REPEAT):
+                        statements.clear()
+                        started = time.perf_counter()
+                        result, status = get_festo_history(data)
+                        latencies.append(time.perf_counter() - started)
+                        db.session.close()
+                    assert status == 200, result
+
+                    points = sum(len(rows) for period in result["data"] for rows in period.values())
+                    latencies.sort()
+                    print(f"{time_type:<7} {days:>3} 天: 查詢 {len(statements):>3} 次, "
+                          f"資料點 {points:>6,}, "
+                          f"中位數 {latencies[len(latencies) // 2] * 1000:8.1f} ms, "
+                          f"最大 {latencies[-1] * 1000:8.1f} ms")
+
+        finally:
+            event.remove(db.engine, "before_cursor_execute", count)
+            db.session.close()
+
+
+if __name__ == "__main__":
+    benchmark_festo_history()
@@ -0,0 +1,90 @@
+"""
+FestoHistory 寫入效能比較腳本
+比較逐筆 ORM db.session.add 與 HistoryWriter 批次 INSERT 的每秒寫入筆數
+HistoryWriter 預設同時更新分鐘/小時彙總表與批次目錄
+測試資料使用獨立批次號碼，結束後會刪除
+"""
+from app import app
+from models.shared import db
+from models.model import FestoHistory, FestoHistoryMinute, FestoHistoryHour, FestoBatchCatalog
+from modules.history_writer import HistoryWriter
+from datetime import datetime, timedelta
+import time
+
+BATCH_NUMBER = "BENCH-HISTORY-WRITER"
+SLAVES = 30
+TICKS = 200
+
+
+def _samples(tick):
+    create_time = datetime.now() - timedelta(seconds=5 * (TICKS - tick))
+    for slave_id in range(1, SLAVES + 1):
+        yield {
+            "slave_id": slave_id,
+            "batch_number": BATCH_NUMBER,
+            "formula_name": "效能測試配方",
+            "sequence": 1,
+            "pressure": 100 + slave_id,
+            "create_time": create_time,
+        }
+
+
+def bench_orm():
+    started = time.perf_counter()
+    for tick in range(TICKS):
+        for sample in _samples(tick):
+            db.session.add(FestoHistory(**sample))
+        db.session.commit()
+    return time.perf_counter() - started
+
+
+def bench_writer(flush_size, rollup=True):
+    writer = HistoryWriter(flush_size=flush_size, flush_interval=3600, rollup=rollup)
+    started = time.perf_counter()
+    for tick in range(TICKS):
+        for sample in _samples(tick):
+            writer.add(**sample)
+        if writer.should_flush():
+            writer.flush(db.engine)
+    writer.flush(db.engine)
+    return time.perf_counter() - started
+
+
+def cleanup():
+    for model in (FestoHistory, FestoHistoryMinute, FestoHistoryHour, FestoBatchCatalog):
+        model.query.filter_by(batch_number=BATCH_NUMBER).delete()
+    db.session.commit()
+
+
+def benchmark_history_writer():
+    with app.app_context():
+        try:
+            rows = SLAVES * TICKS
+            print("=" * 60)
+            print(f"FestoHistory 寫入效能比較: {SLAVES} 台設備 x {TICKS} ticks = {rows:,} 筆")
+            print("=" * 60)
+
+            cases = [("ORM 逐筆 add (每 tick commit)", bench_orm),
+                     ("HistoryWriter flush_size=200 (不更新彙總表)",
+                      lambda: bench_writer(200, rollup=False))]
+            for flush_size in (SLAVES, 200, 1000):
+                cases.append((f"HistoryWriter flush_size={flush_size}",
+                              lambda size=flush_size: bench_writer(size)))
+
+            for name, fn in cases:
+                cleanup()
+                elapsed = fn()
+                print(f"{name:<40} {elapsed:8.2f} 秒 {rows / elapsed:12,.0f} 筆/秒")
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"\n✗ 錯誤: {str(e)}")
+            import traceback
+            traceback.print_exc()
+        finally:
+            cleanup()
+            db.session.close()
+
+
+if __name__ == "__main__":
+    benchmark_history_writer()
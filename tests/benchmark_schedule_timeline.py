@@ -0,0 +1,79 @@
+"""
+排程時間軸效能測試腳本
+比較逐台設備線性比對步驟時間與 ScheduleTimeline 一次查詢所有設備，
+並確認兩者找到的執行中與最接近步驟相同
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from modules.schedule_timeline import ScheduleTimeline
+
+FESTO_COUNTS = [10, 100, 1000]
+STEPS_PER_SCHEDULE = 50
+ROUNDS = 20
+
+
+def build_schedules(festo_count):
+    start = datetime.now() - timedelta(hours=2)
+    schedules = []
+    for index in range(festo_count):
+        time_start = start + timedelta(minutes=index % 180)
+        details = []
+        for sequence in range(STEPS_PER_SCHEDULE):
+            time_end = time_start + timedelta(minutes=5)
+            details.append(SimpleNamespace(sequence=sequence, time_start=time_start, time_end=time_end))
+            time_start = time_end + timedelta(seconds=1)
+        schedules.append(details)
+    return schedules
+
+
+def linear_nearest(details, current_time):
+    nearest = None
+    min_time_diff = None
+    for detail in details:
+        if detail.time_start <= current_time <= detail.time_end:
+            return detail
+        time_diff = min(abs((current_time - detail.time_start).total_seconds()),
+                        abs((current_time - detail.time_end).total_seconds()))
+        if min_time_diff is None or time_diff < min_time_diff:
+            min_time_diff = time_diff
+            nearest = detail
+    return nearest
+
+
+def benchmark_schedule_timeline():
+    print("=" * 60)
+    print(f"排程時間軸效能測試: 每台 {STEPS_PER_SCHEDULE} 個步驟, 重複 {ROUNDS} 次")
+    print("=" * 60)
+
+    current_time = datetime.now()
+    for festo_count in FESTO_COUNTS:
+        schedules = build_schedules(festo_count)
+
+        started = time.perf_counter()
+        for _ in range(ROUNDS):
+            expected = [linear_nearest(details, current_time) for details in schedules]
+        linear = (time.perf_counter() - started) / ROUNDS
+
+        started = time.perf_counter()
+        timeline = ScheduleTimeline(schedules)
+        build = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for _ in range(ROUNDS):
+            _, nearest, _ = timeline.lookup(current_time)
+            found = [timeline.detail(index) for index in nearest]
+        lookup = (time.perf_counter() - started) / ROUNDS
+
+        mark = "✓" if all(a is b for a, b in zip(expected, found)) else "✗ 結果不一致"
+        print(f"{mark} {festo_count:>5} 台: 線性 {linear * 1000:8.2f} ms/tick, "
+              f"時間軸 {lookup * 1000:6.2f} ms/tick (建立 {build * 1000:.1f} ms)")
+
+
+if __name__ == "__main__":
+    benchmark_schedule_timeline()
@@ -0,0 +1,80 @@
+"""
+HTTP 負載測試腳本
+先以要比較的模式啟動伺服器，再執行本腳本:
+    SERVER_MODE=asgi python app.py                    (uvicorn + WsgiToAsgi)
+    gunicorn -c gunicorn.conf.py app:app              (SERVER_MODE=wsgi)
+    python tests/benchmark_server.py [BASE_URL] [並行數] [秒數]
+量測每個端點的每秒請求數與 p50/p99 延遲
+"""
+import http.client
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+BASE_URL = sys.argv[1] if len(sys.argv) > 1 else "http://127.0.0.1:5002"
+CONCURRENCY = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+DURATION = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+PATHS = [
+    "/festo/executing",
+    "/festo",
+    "/history/batch?startTime=2000-01-01%2000:00:00&endTime=2100-01-01%2000:00:00",
+]
+
+
+def _worker(url, deadline, latencies, errors):
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+    path = parts.path + (f"?{parts.query}" if parts.query else "")
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            conn.request("GET", path)
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 500:
+                errors.append(response.status)
+            latencies.append(time.perf_counter() - started)
+        except Exception as e:
+            errors.append(str(e))
+            conn.close()
+            conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+    conn.close()
+
+
+def _percentile(values, percent):
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def benchmark_server():
+    print("=" * 60)
+    print(f"HTTP 負載測試: {BASE_URL}, 並行 {CONCURRENCY}, 每個端點 {DURATION:.0f} 秒")
+    print("=" * 60)
+
+    for path in PATHS:
+        latencies = []
+        errors = []
+        deadline = time.perf_counter() + DURATION
+        threads = [
+            threading.Thread(target=_worker, args=(BASE_URL + path, deadline, latencies, errors))
+            for _ in range(CONCURRENCY)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        if not latencies:
+            print(f"✗ {path}: 沒有成功的請求, 錯誤 {errors[:3]}")
+            continue
+        latencies.sort()
+        print(f"{path.split('?')[0]:<20} {len(latencies) / elapsed:8.1f} req/s  "
+              f"p50 {_percentile(latencies, 50) * 1000:7.1f} ms  "
+              f"p99 {_percentile(latencies, 99) * 1000:7.1f} ms  "
+              f"錯誤 {len(errors)}")
+
+
+if __name__ == "__main__":
+    benchmark_server()
@@ -0,0 +1,107 @@
+"""
+festo_poller 逾時檢查腳本
+以模擬的 Modbus client 取代真實連線，同一閘道上有多個 slave 不回應時，
+確認每一次讀取 (包含 slave 剛斷線與退避結束後重試) 正常設備都讀得到，
+且整批在 1 秒內結束
+"""
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from modules.festo_async import festo_poller
+
+HEALTHY = list(range(1, 11))
+DEAD = [11, 12, 13, 14, 15]
+RESPONSE_TIME = 0.01
+DEVICE_DEADLINE = 2.0
+HEALTHY_DEADLINE = 0.1
+BATCH_DEADLINE = 2.5
+MAX_ELAPSED = 1.0
+
+
+class FakeClient:
+    """不回應的 slave 永遠等待，其餘 slave 在 RESPONSE_TIME 後回應"""
+
+    def __init__(self, dead):
+        self.dead = set(dead)
+        self.connected = True
+
+    async def connect(self):
+        self.connected = True
+        return True
+
+    def close(self):
+        self.connected = False
+
+    async def read_input_registers(self, address, count, device_id):
+        if device_id in self.dead:
+            await asyncio.sleep(3600)
+        await asyncio.sleep(RESPONSE_TIME)
+        return SimpleNamespace(registers=[0, 0], isError=lambda: False)
+
+
+def timed_read(poller, slave_ids):
+    started = time.monotonic()
+    snapshots = poller.read_snapshots(slave_ids)
+    return snapshots, time.monotonic() - started
+
+
+def check_festo_deadline():
+    print("=" * 60)
+    print(f"festo_poller 逾時檢查: {len(HEALTHY)} 台正常, {len(DEAD)} 台不回應, "
+          f"healthy_deadline {HEALTHY_DEADLINE}s, batch_deadline {BATCH_DEADLINE}s")
+    print("=" * 60)
+
+    poller = festo_poller("127.0.0.1", pipeline_depth=1, device_deadline=DEVICE_DEADLINE,
+                          healthy_deadline=HEALTHY_DEADLINE, batch_deadline=BATCH_DEADLINE,
+                          backoff_base=30, backoff_max=30)
+    for slot in poller._slots:
+        slot["client"].close()
+        slot["client"] = FakeClient(DEAD)
+
+    failed = False
+    try:
+        # 先全部正常讀取一次，接著不回應的 slave 斷線；
+        # 不回應的 slave 排在前面，每台最多只能佔用 healthy_deadline
+        slave_ids = DEAD + HEALTHY
+        dead = set(DEAD)
+        for slot in poller._slots:
+            slot["client"].dead = set()
+        timed_read(poller, slave_ids)
+        for slot in poller._slots:
+            slot["client"].dead = dead
+
+        def check_round(name):
+            snapshots, elapsed = timed_read(poller, slave_ids)
+            healthy_ok = sum(snapshots[slave_id] is not None for slave_id in HEALTHY)
+            dead_ok = sum(snapshots[slave_id] is not None for slave_id in DEAD)
+            ok = elapsed <= MAX_ELAPSED and healthy_ok == len(HEALTHY) and dead_ok == 0
+            print(f"{'✓' if ok else '✗'} {name}: {elapsed:.2f}s (上限 {MAX_ELAPSED}s), "
+                  f"正常設備讀到 {healthy_ok}/{len(HEALTHY)}, 不回應設備 {dead_ok}/{len(DEAD)}")
+            return ok
+
+        failed |= not check_round("剛斷線")
+        failed |= not check_round("退避中")
+        # 退避時間到，不回應的 slave 排在正常設備之後重試
+        for slave_id in DEAD:
+            failures, _ = poller._slave_backoff[slave_id]
+            poller._slave_backoff[slave_id] = (failures, 0)
+        failed |= not check_round("退避後重試")
+
+        stats = poller.get_stats()
+        print(f"  deadline_misses={stats['deadline_misses']}, "
+              f"batch_deadline_misses={stats['batch_deadline_misses']}, "
+              f"backoff_skips={stats['backoff_skips']}")
+    finally:
+        poller.close()
+
+    print("全部通過" if not failed else "檢查失敗")
+    return not failed
+
+
+if __name__ == "__main__":
+    sys.exit(0 if check_festo_deadline() else 1)
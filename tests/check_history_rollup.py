@@ -0,0 +1,110 @@
+"""
+歷史彙總表一致性檢查腳本
+建立一個測試批次的原始資料與分鐘/小時彙總表，
+以沒有對齊分鐘或小時的 startTime 呼叫 get_festo_history，
+確認從原始資料與從彙總表查詢的結果相同、同一區間重複寫入時彙總表不會多出資料列，
+結束後刪除測試資料
+"""
+from app import app
+from models.shared import db
+from models.model import FestoHistory
+from controller.history import get_festo_history
+from modules.history_rollup import ROLLUPS, aggregate, upsert_rollups
+from sqlalchemy import delete, func, insert, select
+from datetime import datetime, timedelta
+
+BATCH_NUMBER = "BATCH-ROLLUP-CHECK"
+# 兩天、每 7 秒一筆，涵蓋期間與區間的邊界
+DAYS = 2
+INTERVAL_SECONDS = 7
+
+
+def _rows(start_time):
+    rows = []
+    for index in range(DAYS * 86400 // INTERVAL_SECONDS):
+        create_time = start_time + timedelta(seconds=index * INTERVAL_SECONDS)
+        rows.append({
+            "slave_id": 1,
+            "batch_number": BATCH_NUMBER,
+            # 也包含沒有配方與步驟的資料，確認彙總表能合併同一區間
+            "formula_name": ("配方A" if index % 5 else "配方B") if index % 11 else None,
+            "sequence": index // 3000 if index % 13 else None,
+            "pressure": 100 + index % 37,
+            "create_time": create_time,
+            "update_time": create_time,
+        })
+    return rows
+
+
+def _cleanup():
+    with db.engine.begin() as conn:
+        conn.execute(delete(FestoHistory).where(FestoHistory.batch_number == BATCH_NUMBER))
+        for model, _ in ROLLUPS.values():
+            conn.execute(delete(model).where(model.batch_number == BATCH_NUMBER))
+
+
+def _history(start_time, end_time, time_type, use_rollup):
+    app.config['HISTORY_ROLLUP_ENABLED'] = use_rollup
+    result, status = get_festo_history({
+        'batchNumber': BATCH_NUMBER,
+        'startTime': start_time.strftime('%Y-%m-%d %H:%M:%S'),
+        'endTime': end_time.strftime('%Y-%m-%d %H:%M:%S'),
+        'type': time_type,
+    })
+    assert status == 200, result
+    # 兩邊的平均值型別 (Decimal/float) 不同，比較到小數第 6 位；
+    # 同一時間不同配方的先後順序不固定，排序後再比較
+    return [
+        {key: sorted((row['formulaName'] or '', row['time'],
+                      None if row['avgPressure'] is None else round(float(row['avgPressure']), 6))
+                     for row in rows)
+         for key, rows in period.items()}
+        for period in result['data']
+    ]
+
+
+def check_history_rollup():
+    with app.app_context():
+        rollup_enabled = app.config.get('HISTORY_ROLLUP_ENABLED')
+        data_start = datetime.now().replace(microsecond=0) - timedelta(days=DAYS + 1)
+        rows = _rows(data_start)
+        failed = False
+        try:
+            _cleanup()
+            # 分兩次寫入，兩次的資料落在相同的區間，彙總表必須合併而不是新增資料列
+            for part in (rows[::2], rows[1::2]):
+                with db.engine.begin() as conn:
+                    conn.execute(insert(FestoHistory), part)
+                    upsert_rollups(conn, part)
+            print(f"✓ 建立 {len(rows)} 筆原始資料與彙總表")
+
+            for time_type, (model, truncate) in ROLLUPS.items():
+                expected = len(aggregate(rows, truncate))
+                stored = db.session.scalar(
+                    select(func.count()).select_from(model).where(model.batch_number == BATCH_NUMBER))
+                ok = stored == expected
+                failed |= not ok
+                print(f"{'✓' if ok else '✗'} {model.__tablename__}: {stored} 列 (應為 {expected} 列)")
+
+            # startTime 落在分鐘與小時的中間
+            start_time = data_start + timedelta(hours=1, minutes=17, seconds=23)
+            end_time = start_time + timedelta(days=DAYS)
+            for time_type in ("minute", "hour"):
+                raw = _history(start_time, end_time, time_type, False)
+                rollup = _history(start_time, end_time, time_type, True)
+                points = sum(len(rows) for period in raw for rows in period.values())
+                ok = raw == rollup and points > 0
+                failed |= not ok
+                print(f"{'✓' if ok else '✗'} type={time_type}: 原始資料與彙總表"
+                      f"{'一致' if ok else '不一致'} ({points} 個點)")
+        finally:
+            app.config['HISTORY_ROLLUP_ENABLED'] = rollup_enabled
+            _cleanup()
+            db.session.close()
+
+        print("全部通過" if not failed else "檢查失敗")
+        return not failed
+
+
+if __name__ == "__main__":
+    check_history_rollup()
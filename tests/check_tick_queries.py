@@ -0,0 +1,78 @@
+"""
+排程 tick 查詢次數檢查腳本
+先執行 create_test_data.py 建立測試資料，再執行本腳本
+確認 perform_schedule 的 SELECT 數量不隨設備數增加，
+且排程快取命中時 tick 不再查詢資料庫
+"""
+from app import app
+from models.shared import db
+from models.festo import FestoMain
+from scheduler.scheduler import control_loop, load_tick_festos, perform_schedule
+from sqlalchemy import event
+import threading
+
+MAX_TICK_SELECTS = 2
+
+
+class QueryCounter:
+    """只記錄建立時所在執行緒的查詢，其他執行緒的查詢不計入"""
+
+    def __init__(self):
+        self.statements = []
+        self.thread_id = threading.get_ident()
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == self.thread_id:
+            self.statements.append(statement)
+
+    @property
+    def selects(self):
+        return [s for s in self.statements if s.lstrip().upper().startswith("SELECT")]
+
+
+def check_tick_queries():
+    # app 啟動時已開始執行排程，先停止控制迴圈，由本腳本自行呼叫 perform_schedule
+    control_loop.stop(10)
+    with app.app_context():
+        festo_count = FestoMain.query.count()
+        db.session.close()
+
+        counter = QueryCounter()
+        event.listen(db.engine, "before_cursor_execute", counter)
+        try:
+            festos = load_tick_festos()
+            # 存取排程會用到的關聯，確認不會再觸發 lazy load
+            for festo in festos:
+                festo.formula and festo.formula.name
+                festo.festo_current_detail
+                festo.schedule and list(festo.schedule.schedule_details)
+            db.session.close()
+            load_selects = len(counter.selects)
+
+            counter.statements.clear()
+            perform_schedule()
+            tick_selects = len(counter.selects)
+
+            # 第二個 tick 使用排程快取
+            counter.statements.clear()
+            perform_schedule()
+            cached_tick_selects = len(counter.selects)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", counter)
+
+        print("=" * 60)
+        print(f"設備數量: {festo_count}")
+        print(f"load_tick_festos SELECT 數: {load_selects}")
+        print(f"perform_schedule SELECT 數: {tick_selects}")
+        print(f"perform_schedule (快取命中) SELECT 數: {cached_tick_selects}")
+        print(f"perform_schedule (快取命中) 總查詢數: {len(counter.statements)}")
+        print("=" * 60)
+
+        assert load_selects <= MAX_TICK_SELECTS
+        assert tick_selects <= MAX_TICK_SELECTS
+        assert cached_tick_selects == 0, counter.selects
+        print("✓ 每個 tick 的 SELECT 數量與設備數無關")
+
+
+if __name__ == "__main__":
+    check_tick_queries()
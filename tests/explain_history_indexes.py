@@ -0,0 +1,76 @@
+"""
+FestoHistory 索引檢查腳本
+先執行 create_history_test_data.py 建立測試資料，再執行本腳本
+以 EXPLAIN 確認歷史查詢使用 festo_history 的索引而不是全表掃描
+分區模式下同時列出查詢實際掃描的分區
+"""
+from app import app
+from models.shared import db
+from models.model import FestoHistory
+from sqlalchemy import delete, func, select
+from datetime import datetime, timedelta
+
+BATCH_INDEX = "ix_festo_history_batch_number_create_time"
+TIME_INDEX = "ix_festo_history_create_time"
+
+
+def _queries(batch_number, start_time, end_time):
+    date_format_str = '%Y-%m-%d %H:%i'
+    in_range = FestoHistory.create_time.between(start_time, end_time)
+    return [
+        # get_batch_records_export
+        ("export", {BATCH_INDEX},
+         select(FestoHistory).where(in_range, FestoHistory.batch_number == batch_number)),
+        # get_festo_history
+        ("history", {BATCH_INDEX},
+         select(
+             FestoHistory.formula_name,
+             func.avg(FestoHistory.pressure),
+             func.date_format(FestoHistory.create_time, date_format_str),
+         )
+         .where(FestoHistory.batch_number == batch_number, in_range)
+         .group_by(FestoHistory.formula_name,
+                   func.date_format(FestoHistory.create_time, date_format_str))),
+        # history_checker
+        ("retention", {TIME_INDEX},
+         delete(FestoHistory).where(FestoHistory.create_time <= start_time)),
+    ]
+
+
+def explain_history_indexes():
+    with app.app_context():
+        try:
+            row = db.session.query(FestoHistory.batch_number).first()
+            if row is None:
+                print("✗ festo_history 沒有資料，請先執行 create_history_test_data.py")
+                return
+
+            end_time = datetime.now()
+            start_time = end_time - timedelta(hours=1)
+            connection = db.session.connection()
+            failed = []
+
+            print("=" * 60)
+            for name, expected, stmt in _queries(row.batch_number, start_time, end_time):
+                compiled = stmt.compile(dialect=db.engine.dialect)
+                plans = connection.exec_driver_sql(
+                    "EXPLAIN " + str(compiled), compiled.params).mappings().all()
+                keys = {plan["key"] for plan in plans if plan["table"] == "festo_history"}
+                ok = bool(keys & expected)
+                # 分區模式下 partitions 欄位顯示實際掃描的分區 (partition pruning)
+                partitions = {plan.get("partitions") for plan in plans if plan["table"] == "festo_history"}
+                print(f"{'✓' if ok else '✗'} {name:<15} key={keys} type={[p['type'] for p in plans]} "
+                      f"partitions={partitions}")
+                if not ok:
+                    failed.append(name)
+            print("=" * 60)
+
+            assert not failed, f"查詢沒有使用索引: {failed}"
+            print("✓ 所有歷史查詢都使用索引")
+
+        finally:
+            db.session.close()
+
+
+if __name__ == "__main__":
+    explain_history_indexes()